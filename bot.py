@@ -3,22 +3,40 @@ import logging
 import json
 import re
 import os
+import sys
 import requests
-from collections import deque
+import aiohttp
+from collections import deque, OrderedDict
 import datetime
 import time
 import random
+import cProfile
+import pstats
+import io
+import contextvars
+import functools
+import html
+import multiprocessing
+import heapq
+import concurrent.futures
+import hashlib
+from array import array
 
 # Importamos dotenv para cargar las variables de entorno localmente
 from dotenv import load_dotenv
 
-from aiogram import Bot, Dispatcher, types, F
+from aiogram import Bot, Dispatcher, BaseMiddleware, types, F
 from aiogram.enums import ParseMode
-from aiogram.filters import Command
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from aiogram.filters import Command, CommandObject
 from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 
+from shared_state import SharedStore, SQLiteStorage
+from catalog_journal import CatalogJournal, JournalFollower, JournalGap
+
 # Carga las variables de entorno del archivo .env
 load_dotenv()
 
@@ -33,9 +51,76 @@ ADMIN_ID = "6115976248"
 
 # ID del canal de prueba que me enviaste
 TELEGRAM_CHANNEL_ID = -1002139779491 
+# Canales espejo donde también se publica (separados por comas en TELEGRAM_CHANNEL_IDS)
+TELEGRAM_CHANNEL_IDS = [int(c) for c in os.getenv("TELEGRAM_CHANNEL_IDS", str(TELEGRAM_CHANNEL_ID)).split(",") if c.strip()]
+# Cuántos canales se atienden a la vez al publicar
+PUBLISH_CONCURRENCY = 5
+# Intentos al editar un post cuando Telegram pide esperar (retry_after)
+EDIT_MAX_ATTEMPTS = 3
+# Versión de la plantilla de publicación: cambiarla invalida los posts renderizados en caché
+POST_TEMPLATE_VERSION = 1
+RENDERED_POST_CACHE_SIZE = 1000
+# Modo multiproceso: número de workers (1 = un solo proceso, como siempre),
+# base compartida, duración del arrendamiento del líder y frecuencia de sincronización del catálogo
+WORKER_COUNT = int(os.getenv("WORKER_COUNT", "1"))
+SHARED_DB_FILE = "bot_state.sqlite3"
+LEADER_LEASE_TTL = 30
+CATALOG_SYNC_INTERVAL = 1
+# Los cambios del catálogo que ya leyeron todos los workers se borran; un worker que no
+# consulta en este tiempo deja de contar
+CATALOG_CHANGES_MAX_AGE = 600
+# Cada cuánto revisa el proceso principal que los workers sigan vivos y cuántos reinicios
+# por minuto tolera antes de detener el bot
+WORKER_CHECK_INTERVAL = 5
+WORKER_MAX_RESTARTS = 5
+# Analítica de demanda: tamaño del sketch, títulos retenidos por ventana y si la
+# publicación automática prioriza las películas más pedidas
+DEMAND_SKETCH_WIDTH = 2048
+DEMAND_SKETCH_DEPTH = 4
+DEMAND_TOP_K = 20
+AUTO_POST_DEMAND_WEIGHTING = True
+# En modo multiproceso, cada cuánto publica cada worker sus conteos y lee los de los demás
+DEMAND_SYNC_INTERVAL = 60
+# Cuántas películas al azar se sortean en cada reposición de candidatos automáticos
+AUTO_POST_CANDIDATE_SAMPLE = 500
+# Trabajos en segundo plano: procesos simultáneos, cada cuántos segundos se edita
+# el mensaje de progreso, pausa entre publicaciones y archivo de estado
+JOB_WORKERS = 2
+JOB_PROGRESS_INTERVAL = 5
+JOB_PUBLISH_SPACING = 3
+JOBS_FILE = "jobs.json"
+# Sincronización de populares: listas y páginas de TMDB a consultar y cada cuánto
+POPULAR_SYNC_LISTS = ("popular", "now_playing")
+POPULAR_SYNC_PAGES = 3
+POPULAR_SYNC_INTERVAL = 6 * 3600
+# En modo multiproceso solo el líder consulta TMDB; los demás workers leen su resultado
+POPULAR_SHARE_INTERVAL = 60
+# Perfilado: a partir de cuántos segundos se registra una actualización como lenta
+SLOW_UPDATE_THRESHOLD = 1.0
 BASE_TMDB_URL = "https://api.themoviedb.org/3"
 POSTER_BASE_URL = "https://image.tmdb.org/t/p/w500"
 MOVIES_DB_FILE = "movies.json"
+# Registro de cambios del catálogo: archivo, carpeta de historial, cada cuántos
+# cambios se compacta en una instantánea y cuántas instantáneas se conservan
+JOURNAL_FILE = "movies.journal"
+JOURNAL_ARCHIVE_DIR = "journal"
+JOURNAL_COMPACT_EVERY = 500
+JOURNAL_ARCHIVE_KEEP = 20
+# Instancia espejo de solo lectura: carpeta de la instancia principal cuyo registro se sigue
+# y token de su propio bot (dos procesos no pueden leer las actualizaciones del mismo bot)
+CATALOG_FOLLOW_DIR = os.getenv("CATALOG_FOLLOW_DIR")
+MIRROR_BOT_TOKEN = os.getenv("MIRROR_BOT_TOKEN")
+if CATALOG_FOLLOW_DIR and not MIRROR_BOT_TOKEN:
+    raise SystemExit("La instancia espejo necesita MIRROR_BOT_TOKEN con el token de otro bot.")
+# Con WORKER_COUNT > 1 el catálogo vive en la base compartida y no se escriben ni el registro
+# ni movies.json, así que un espejo se quedaría para siempre con la instantánea inicial
+if CATALOG_FOLLOW_DIR and os.path.exists(os.path.join(CATALOG_FOLLOW_DIR, SHARED_DB_FILE)):
+    raise SystemExit(
+        f"La instancia principal en {CATALOG_FOLLOW_DIR} funciona con varios procesos (WORKER_COUNT > 1) "
+        f"y no escribe el registro de cambios del catálogo: no se puede seguir. Si ya no usa varios procesos, "
+        f"borra {SHARED_DB_FILE} de esa carpeta."
+    )
+JOURNAL_FOLLOW_INTERVAL = 1
 
 # Constantes para Trakt.tv
 TRAKT_BASE_URL = "https://api.trakt.tv"
@@ -59,11 +144,34 @@ memes = [
 logging.basicConfig(level=logging.INFO)
 
 # 2. Inicialización del bot, dispatcher y la "base de datos"
-bot = Bot(token=TELEGRAM_BOT_TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+bot = Bot(token=MIRROR_BOT_TOKEN if CATALOG_FOLLOW_DIR else TELEGRAM_BOT_TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
 dp = Dispatcher()
 movies_db = {}
+# Solo se usan en modo multiproceso (ver run_sharded)
+shared_store = None
+# Las escrituras en la base compartida se hacen en orden y fuera del bucle de eventos
+shared_writes = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="shared-store")
+WORKER_ID = "main"
+catalog_journal = None
+catalog_follower = None
 AUTO_POST_COUNT = 4
 MOVIES_PER_PAGE = 5
+# Precarga de publicaciones: cuántos candidatos automáticos preparar por adelantado,
+# reintentos con espera exponencial y antigüedad máxima de los datos precargados
+AUTO_POST_PREFETCH_COUNT = 3
+PREFETCH_MAX_ATTEMPTS = 4
+PREFETCH_BASE_DELAY = 5
+PREFETCH_TTL = 6 * 3600
+# Auditoría de enlaces: frecuencia, concurrencia, separación entre sondeos (s),
+# tiempo máximo por sondeo y vigencia de cada resultado
+LINK_AUDIT_INTERVAL = 24 * 3600
+LINK_AUDIT_CONCURRENCY = 4
+LINK_AUDIT_SPACING = 2
+LINK_AUDIT_TIMEOUT = 20
+LINK_STATUS_TTL = 12 * 3600
+# Rutas a las que terabox/terasharelink redirigen un enlace caído y textos de su página de error
+DEAD_LINK_URL_MARKERS = ("/error", "share/error")
+DEAD_LINK_BODY_MARKERS = ("link has expired", "has been deleted", "share does not exist")
 
 # Estados para la máquina de estados de aiogram
 class MovieUploadStates(StatesGroup):
@@ -76,31 +184,652 @@ class MovieRequestStates(StatesGroup):
 class AdminStates(StatesGroup):
     waiting_for_auto_post_count = State()
 
+# Perfilado de manejadores
+# Tiempo acumulado por llamada externa (TMDB, Trakt, Telegram) de la actualización en curso
+current_update_spans = contextvars.ContextVar("current_update_spans", default=None)
+
+def record_span(name, seconds):
+    spans = current_update_spans.get()
+    if spans is not None:
+        spans[name] = spans.get(name, 0.0) + seconds
+
+def profile_span(name):
+    """Decorador que suma la duración de una llamada síncrona al desglose de la actualización."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record_span(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+class TimedCoroutine:
+    """
+    Ejecuta una corrutina paso a paso midiendo cuánto tiempo corre sin ceder
+    el control, es decir, cuánto bloquea el bucle de eventos.
+    """
+    def __init__(self, coro):
+        self.coro = coro
+        self.blocking = 0.0
+
+    def __await__(self):
+        value, error = None, None
+        while True:
+            start = time.perf_counter()
+            try:
+                if error is not None:
+                    future = self.coro.throw(error)
+                else:
+                    future = self.coro.send(value)
+            except StopIteration as e:
+                self.blocking += time.perf_counter() - start
+                return e.value
+            self.blocking += time.perf_counter() - start
+            try:
+                value, error = (yield future), None
+            except BaseException as e:
+                value, error = None, e
+
+class TelegramTimingMiddleware(BaseRequestMiddleware):
+    async def __call__(self, make_request, bot, method):
+        start = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        finally:
+            record_span(f"telegram.{type(method).__name__}", time.perf_counter() - start)
+
+class UpdateProfiler(BaseMiddleware):
+    """
+    Mide el tiempo total y el tiempo de bloqueo del bucle de cada manejador,
+    registra las actualizaciones lentas y, bajo demanda, captura con cProfile
+    las siguientes N actualizaciones.
+    """
+    def __init__(self):
+        self.capture_remaining = 0
+        self.capture_active = 0
+        self.capture_chat_id = None
+        self.profile = None
+
+    def start_capture(self, count, chat_id):
+        self.profile = self.profile or cProfile.Profile()
+        self.capture_remaining = count
+        self.capture_chat_id = chat_id
+
+    def begin_capture(self):
+        if self.capture_remaining <= 0:
+            return False
+        self.capture_remaining -= 1
+        if self.capture_active == 0:
+            self.profile.enable()
+        self.capture_active += 1
+        return True
+
+    async def end_capture(self):
+        self.capture_active -= 1
+        if self.capture_active:
+            return
+        self.profile.disable()
+        if self.capture_remaining == 0:
+            await self.send_report()
+
+    async def send_report(self):
+        profile, self.profile = self.profile, None
+        stream = io.StringIO()
+        pstats.Stats(profile, stream=stream).sort_stats("cumulative").print_stats(60)
+        try:
+            await bot.send_document(
+                self.capture_chat_id,
+                types.BufferedInputFile(stream.getvalue().encode("utf-8"), filename="perfil.txt"),
+                caption="📊 Perfil de las últimas actualizaciones."
+            )
+        except Exception as e:
+            logging.error(f"No se pudo enviar el perfil: {e}")
+
+    async def __call__(self, handler, event, data):
+        handler_object = data.get("handler")
+        handler_name = getattr(handler_object.callback, "__name__", "desconocido") if handler_object else "desconocido"
+        spans = {}
+        token = current_update_spans.set(spans)
+        captured = self.begin_capture()
+        timed = TimedCoroutine(handler(event, data))
+        start = time.perf_counter()
+        try:
+            return await timed
+        finally:
+            wall = time.perf_counter() - start
+            current_update_spans.reset(token)
+            if captured:
+                await self.end_capture()
+            if wall >= SLOW_UPDATE_THRESHOLD:
+                breakdown = ", ".join(f"{name}={seconds * 1000:.0f} ms" for name, seconds in sorted(spans.items(), key=lambda item: -item[1]))
+                logging.warning(
+                    f"Actualización lenta en '{handler_name}': {wall * 1000:.0f} ms en total, "
+                    f"{timed.blocking * 1000:.0f} ms bloqueando el bucle"
+                    + (f" ({breakdown})" if breakdown else "")
+                )
+
+profiler = UpdateProfiler()
+dp.message.middleware(profiler)
+dp.callback_query.middleware(profiler)
+bot.session.middleware(TelegramTimingMiddleware())
+
+# Instancia espejo: manejadores que publican en los canales o cambian el catálogo
+catalog_writers = set()
+
+def catalog_writer(handler):
+    """Marca un manejador que una instancia espejo de solo lectura no debe atender."""
+    catalog_writers.add(handler)
+    return handler
+
+class ReadOnlyMirrorMiddleware(BaseMiddleware):
+    async def __call__(self, handler, event, data):
+        handler_object = data.get("handler")
+        if catalog_follower and handler_object and handler_object.callback in catalog_writers:
+            text = "Esta es una copia de solo lectura del bot. Usa el bot principal para esta acción."
+            if isinstance(event, types.CallbackQuery):
+                await event.answer(text, show_alert=True)
+            else:
+                await event.reply(text)
+            return None
+        return await handler(event, data)
+
+dp.message.middleware(ReadOnlyMirrorMiddleware())
+dp.callback_query.middleware(ReadOnlyMirrorMiddleware())
+
 # 3. Funciones auxiliares para la base de datos de películas
-def load_movies_db():
-    global movies_db
+class MovieRecord:
+    """
+    Entrada compacta del catálogo. Los nombres se deduplican y se internan
+    para que los alias repetidos compartan la misma cadena en memoria.
+    """
+    __slots__ = ("key", "names", "id", "link", "message_ids", "post_hashes", "link_alive", "link_checked_at")
+
+    def __init__(self, key, names, movie_id, link, message_ids=None, link_alive=None, link_checked_at=None,
+                 post_hashes=None):
+        self.key = sys.intern(key)
+        self.names = tuple(dict.fromkeys(sys.intern(name) for name in names if name))
+        self.id = int(movie_id) if movie_id is not None else None
+        self.link = link
+        # ID del último mensaje publicado en cada canal
+        self.message_ids = message_ids or {}
+        # Huella del texto y el póster publicados en cada canal, para no editar lo que no cambió
+        self.post_hashes = post_hashes or {}
+        # None mientras el enlace no se haya auditado
+        self.link_alive = link_alive
+        # Momento del último sondeo del enlace, para no repetirlo al reiniciar
+        self.link_checked_at = link_checked_at
+
+    @classmethod
+    def from_dict(cls, key, data):
+        message_ids = {int(chat_id): message_id for chat_id, message_id in (data.get("message_ids") or {}).items()}
+        # Formato anterior: un único mensaje en el canal principal
+        if not message_ids and data.get("last_message_id"):
+            message_ids[TELEGRAM_CHANNEL_ID] = data["last_message_id"]
+        return cls(
+            key,
+            data.get("names") or [],
+            data.get("id"),
+            data.get("link"),
+            message_ids,
+            data.get("link_alive"),
+            data.get("link_checked_at"),
+            {int(chat_id): post_hash for chat_id, post_hash in (data.get("post_hashes") or {}).items()},
+        )
+
+    def to_dict(self):
+        return {
+            "names": list(self.names),
+            "id": self.id,
+            "link": self.link,
+            "message_ids": {str(chat_id): message_id for chat_id, message_id in self.message_ids.items()},
+            "post_hashes": {str(chat_id): post_hash for chat_id, post_hash in self.post_hashes.items()},
+            "link_alive": self.link_alive,
+            "link_checked_at": self.link_checked_at,
+        }
+
+    @property
+    def last_message_id(self):
+        """Último mensaje publicado en el canal principal."""
+        return self.message_ids.get(TELEGRAM_CHANNEL_ID)
+
+    @property
+    def title(self):
+        return self.names[0] if self.names else "Título desconocido"
+
+    def aliases(self):
+        """Nombres en minúsculas con los que se puede encontrar la película."""
+        return dict.fromkeys(sys.intern(name.lower()) for name in (*self.names, self.key))
+
+# Índices secundarios del catálogo (se construyen en segundo plano al arrancar)
+movies_by_id = {}
+movies_by_alias = {}
+catalog_indexed = False
+
+def iter_catalog_items(f, chunk_size=64 * 1024):
+    """
+    Lee el objeto JSON de nivel superior por bloques y va entregando pares
+    (clave, valor) sin cargar el archivo completo en un único documento.
+    """
+    decoder = json.JSONDecoder()
+    buf, pos, eof = "", 0, False
+
+    def more():
+        nonlocal buf, pos, eof
+        chunk = f.read(chunk_size)
+        if not chunk:
+            eof = True
+            return False
+        buf = buf[pos:] + chunk
+        pos = 0
+        return True
+
+    def skip_ws():
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n":
+                pos += 1
+            if pos < len(buf) or not more():
+                return
+
+    def expect(char):
+        nonlocal pos
+        skip_ws()
+        if pos >= len(buf) or buf[pos] != char:
+            raise json.JSONDecodeError(f"Se esperaba '{char}'", buf, pos)
+        pos += 1
+
+    def decode():
+        nonlocal pos
+        skip_ws()
+        while True:
+            try:
+                value, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if not more():
+                    raise
+                continue
+            # Un número al final del bloque podría estar cortado ("12" de "1234", "-1" de "-1.5e10"):
+            # solo está completo si le sigue un separador o se terminó el archivo
+            is_number = isinstance(value, (int, float)) and not isinstance(value, bool)
+            if is_number and not eof and (end == len(buf) or buf[end] not in " \t\r\n,:]}") and more():
+                continue
+            pos = end
+            return value
+
+    expect("{")
+    skip_ws()
+    if pos < len(buf) and buf[pos] == "}":
+        return
+    while True:
+        key = decode()
+        expect(":")
+        value = decode()
+        yield key, value
+        skip_ws()
+        if pos < len(buf) and buf[pos] == "}":
+            return
+        expect(",")
+
+def read_catalog_snapshot(path):
     try:
-        with open(MOVIES_DB_FILE, "r", encoding="utf-8") as f:
-            movies_db = json.load(f)
-            logging.info(f"Se cargaron {len(movies_db)} películas de la base de datos.")
+        with open(path, "r", encoding="utf-8") as f:
+            return {
+                sys.intern(key): MovieRecord.from_dict(key, data)
+                for key, data in iter_catalog_items(f)
+            }
     except (FileNotFoundError, json.JSONDecodeError):
         logging.warning("No se encontró el archivo de la base de datos o está vacío. Se creará uno nuevo.")
-        movies_db = {}
+        return {}
+
+def load_movies_db():
+    """
+    Carga el catálogo: desde la base compartida en modo multiproceso o, si no,
+    desde la última instantánea más los cambios registrados después de ella.
+    """
+    global movies_db, catalog_indexed, catalog_journal, catalog_follower
+    start = time.perf_counter()
+    catalog_indexed = False
+    movies_by_id.clear()
+    movies_by_alias.clear()
+    if shared_store:
+        movies_db = {
+            sys.intern(key): MovieRecord.from_dict(key, data)
+            for key, data in shared_store.load_catalog()
+        }
+        entries = []
+    elif CATALOG_FOLLOW_DIR:
+        if not catalog_follower:
+            catalog_follower = JournalFollower(
+                os.path.join(CATALOG_FOLLOW_DIR, JOURNAL_FILE), os.path.join(CATALOG_FOLLOW_DIR, JOURNAL_ARCHIVE_DIR)
+            )
+        snapshot_path, entries = catalog_follower.resync()
+        movies_db = read_catalog_snapshot(snapshot_path)
+    else:
+        movies_db = read_catalog_snapshot(MOVIES_DB_FILE)
+        if catalog_journal:
+            catalog_journal.close()
+        catalog_journal = CatalogJournal(JOURNAL_FILE, MOVIES_DB_FILE, JOURNAL_ARCHIVE_DIR, JOURNAL_ARCHIVE_KEEP)
+        entries = catalog_journal.open()
+
+    for entry in entries:
+        apply_journal_entry(movies_db, entry)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    logging.info(f"Se cargaron {len(movies_db)} películas de la base de datos ({len(entries)} cambios aplicados) en {elapsed_ms:.1f} ms.")
 
 def save_movies_db():
-    with open(MOVIES_DB_FILE, "w", encoding="utf-8") as f:
-        json.dump(movies_db, f, ensure_ascii=False, indent=4)
-        logging.info("Base de datos de películas guardada con éxito.")
+    """Escribe la instantánea completa del catálogo de forma atómica."""
+    temp_file = f"{MOVIES_DB_FILE}.tmp"
+    with open(temp_file, "w", encoding="utf-8") as f:
+        json.dump({key: record.to_dict() for key, record in movies_db.items()}, f, ensure_ascii=False, indent=4)
+    os.replace(temp_file, MOVIES_DB_FILE)
+    logging.info("Base de datos de películas guardada con éxito.")
+
+def apply_journal_entry(catalog, entry):
+    """Aplica un cambio registrado a un catálogo de MovieRecord."""
+    op, key = entry["op"], entry["key"]
+    if op == "insert":
+        catalog[sys.intern(key)] = MovieRecord.from_dict(key, entry["data"])
+        return
+    if op == "delete":
+        catalog.pop(key, None)
+        return
+
+    record = catalog.get(key)
+    if not record:
+        return
+    if op == "update_link":
+        record.link = entry["link"]
+        record.link_alive = None
+        record.link_checked_at = None
+    elif op == "set_message_id":
+        if entry["message_id"] is None:
+            record.message_ids.pop(entry["chat_id"], None)
+        else:
+            record.message_ids[entry["chat_id"]] = entry["message_id"]
+        if entry.get("post_hash"):
+            record.post_hashes[entry["chat_id"]] = entry["post_hash"]
+        else:
+            record.post_hashes.pop(entry["chat_id"], None)
+    elif op == "set_post_hash":
+        record.post_hashes[entry["chat_id"]] = entry["post_hash"]
+    elif op == "set_link_alive":
+        record.link_alive = entry["alive"]
+        record.link_checked_at = entry.get("checked_at")
+
+def log_shared_write_error(future):
+    if future.exception():
+        logging.error(f"Error al guardar un cambio del catálogo en la base compartida: {future.exception()}")
+
+def log_change(op, key, **fields):
+    """
+    Persiste un cambio del catálogo ya aplicado en memoria: una fila en la base
+    compartida o una línea al final del registro, que se compacta de vez en cuando.
+    """
+    if catalog_follower:
+        # Los manejadores que cambian el catálogo están desactivados en la instancia espejo (ver catalog_writer)
+        logging.error(f"Instancia espejo de solo lectura: no se guarda el cambio '{op}' de '{key}'.")
+        return
+    if shared_store:
+        shared_writes.submit(shared_store.apply_change, op, key, fields).add_done_callback(log_shared_write_error)
+        return
+    if not catalog_journal:
+        save_movies_db()
+        return
+    catalog_journal.append(op, key, **fields)
+    if catalog_journal.pending >= JOURNAL_COMPACT_EVERY:
+        catalog_journal.compact(save_movies_db)
+        logging.info(f"Registro de cambios compactado en la secuencia {catalog_journal.seq}.")
+
+def index_movie(record):
+    if record.id is not None:
+        movies_by_id.setdefault(record.id, record)
+    for alias in record.aliases():
+        movies_by_alias.setdefault(alias, record)
+
+def unindex_movie(record):
+    if movies_by_id.get(record.id) is record:
+        del movies_by_id[record.id]
+    for alias in record.aliases():
+        if movies_by_alias.get(alias) is record:
+            del movies_by_alias[alias]
+
+async def build_catalog_indexes(batch_size=500):
+    """
+    Construye los índices por ID y por alias sin bloquear el bucle de eventos.
+    Mientras no terminen, las búsquedas recorren el catálogo de forma lineal.
+    """
+    global catalog_indexed
+    start = time.perf_counter()
+    for i, record in enumerate(list(movies_db.values()), start=1):
+        if movies_db.get(record.key) is record:
+            index_movie(record)
+        if i % batch_size == 0:
+            await asyncio.sleep(0)
+    catalog_indexed = True
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    logging.info(f"Índices del catálogo listos: {len(movies_by_id)} IDs y {len(movies_by_alias)} alias en {elapsed_ms:.1f} ms.")
+
+def replace_movie_record(key, record):
+    """Sustituye (o elimina, si record es None) una entrada en memoria manteniendo índices y cachés."""
+    global popular_stale
+    popular_stale = True
+    old_record = movies_db.pop(key, None)
+    if old_record:
+        unindex_movie(old_record)
+        invalidate_rendered_posts(old_record.id)
+    if record:
+        movies_db[record.key] = record
+        index_movie(record)
+        invalidate_rendered_posts(record.id)
+
+def upsert_movie(key, names, movie_id, link):
+    """Agrega o reemplaza una película del catálogo manteniendo los índices."""
+    record = MovieRecord(key.lower(), names, movie_id, link)
+    replace_movie_record(record.key, record)
+    log_change("insert", record.key, data=record.to_dict())
+    return record
+
+def update_movie_link(record, link):
+    record.link = link
+    record.link_alive = None
+    record.link_checked_at = None
+    invalidate_rendered_posts(record.id)
+    log_change("update_link", record.key, link=link)
+
+def delete_movie(record):
+    replace_movie_record(record.key, None)
+    log_change("delete", record.key)
+
+def apply_catalog_change(key, data):
+    """Aplica al catálogo en memoria un cambio hecho por otro proceso."""
+    replace_movie_record(key, MovieRecord.from_dict(key, data) if data is not None else None)
+
+def apply_followed_entry(entry):
+    """Aplica en una instancia espejo un cambio leído del registro de la instancia principal."""
+    key = entry["key"]
+    old_record = movies_db.get(key)
+    if old_record:
+        unindex_movie(old_record)
+        invalidate_rendered_posts(old_record.id)
+    apply_journal_entry(movies_db, entry)
+    record = movies_db.get(key)
+    if record:
+        index_movie(record)
+        invalidate_rendered_posts(record.id)
+
+def get_movie_by_id(movie_id):
+    if catalog_indexed:
+        return movies_by_id.get(movie_id)
+    return next((record for record in movies_db.values() if record.id == movie_id), None)
 
 def find_movie_in_db(title_to_find):
-    for main_title, movie_data in movies_db.items():
-        if "names" in movie_data and title_to_find.lower() in [name.lower() for name in movie_data["names"]]:
-            return main_title, movie_data
-        elif main_title.lower() == title_to_find.lower():
-            return main_title, movie_data
+    title_lower = title_to_find.lower()
+    if catalog_indexed:
+        record = movies_by_alias.get(title_lower)
+        return (record.key, record) if record else (None, None)
+    for main_title, record in movies_db.items():
+        if title_lower in record.aliases():
+            return main_title, record
     return None, None
 
+# Analítica de demanda
+class CountMinSketch:
+    """
+    Contador aproximado de memoria fija: nunca subestima y sobreestima como
+    mucho en proporción al total de eventos dividido por el ancho.
+    """
+    __slots__ = ("width", "depth", "rows")
+
+    def __init__(self, width=DEMAND_SKETCH_WIDTH, depth=DEMAND_SKETCH_DEPTH):
+        self.width = width
+        self.depth = depth
+        self.rows = [array("I", bytes(4 * width)) for _ in range(depth)]
+
+    def _indexes(self, item):
+        # Doble hashing con un hash estable entre procesos (hash() cambia en cada arranque),
+        # para que los sketches de distintos workers se puedan sumar
+        h = int.from_bytes(hashlib.blake2b(item.encode("utf-8"), digest_size=8).digest(), "little")
+        h1, h2 = h & 0xFFFFFFFF, ((h >> 32) & 0xFFFFFFFF) | 1
+        return [(h1 + i * h2) % self.width for i in range(self.depth)]
+
+    def add(self, item, count=1):
+        """Suma `count` al elemento y devuelve su nueva estimación."""
+        estimate = None
+        for row, index in zip(self.rows, self._indexes(item)):
+            row[index] += count
+            estimate = row[index] if estimate is None else min(estimate, row[index])
+        return estimate
+
+    def estimate(self, item):
+        return min(row[index] for row, index in zip(self.rows, self._indexes(item)))
+
+    def to_bytes(self):
+        return b"".join(row.tobytes() for row in self.rows)
+
+    def merge_bytes(self, data):
+        """Suma a este sketch otro del mismo tamaño serializado con to_bytes()."""
+        other = array("I", data)
+        for i, row in enumerate(self.rows):
+            offset = i * self.width
+            for j in range(self.width):
+                row[j] += other[offset + j]
+
+class TopK:
+    """Los k elementos con mayor estimación, mantenidos con un montículo de mínimos."""
+    __slots__ = ("k", "counts", "heap")
+
+    def __init__(self, k=DEMAND_TOP_K):
+        self.k = k
+        self.counts = {}
+        self.heap = []
+
+    def _min(self):
+        # Descarta entradas obsoletas del montículo (conteos ya actualizados)
+        while self.heap:
+            count, item = self.heap[0]
+            if self.counts.get(item) == count:
+                return count, item
+            heapq.heappop(self.heap)
+        return None
+
+    def update(self, item, count):
+        if item not in self.counts and len(self.counts) >= self.k:
+            smallest = self._min()
+            if smallest and count <= smallest[0]:
+                return
+            heapq.heappop(self.heap)
+            del self.counts[smallest[1]]
+        self.counts[item] = count
+        heapq.heappush(self.heap, (count, item))
+        if len(self.heap) > 4 * self.k:
+            self.heap = [(c, i) for i, c in self.counts.items()]
+            heapq.heapify(self.heap)
+
+    def items(self):
+        return sorted(self.counts.items(), key=lambda item: -item[1])
+
+class DemandTracker:
+    """
+    Cuenta solicitudes por título en ventanas por hora y por día con memoria
+    fija, sea cual sea el tráfico. En modo multiproceso se le suman los conteos
+    que publican los demás workers (ver demand_sync_task).
+    """
+    WINDOWS = {"hora": 3600, "día": 86400}
+
+    def __init__(self, name):
+        self.name = name
+        self.windows = {name: self._new_window(period) for name, period in self.WINDOWS.items()}
+        # Ventanas de los demás workers ya sumadas: ventana → (inicio, sketch, títulos candidatos)
+        self.remote = {}
+
+    @staticmethod
+    def _new_window(period, now=None):
+        now = time.time() if now is None else now
+        return {"start": now - now % period, "sketch": CountMinSketch(), "top": TopK()}
+
+    def _current(self, name, now):
+        window = self.windows[name]
+        period = self.WINDOWS[name]
+        if now - window["start"] >= period:
+            window = self.windows[name] = self._new_window(period, now)
+        return window
+
+    def record(self, item):
+        now = time.time()
+        for name in self.windows:
+            window = self._current(name, now)
+            window["top"].update(item, window["sketch"].add(item))
+
+    def _remote(self, window, start):
+        remote = self.remote.get(window)
+        return remote if remote and remote[0] == start else None
+
+    def estimate(self, item, window="día"):
+        current = self._current(window, time.time())
+        remote = self._remote(window, current["start"])
+        # La suma de estimaciones tampoco subestima nunca
+        return current["sketch"].estimate(item) + (remote[1].estimate(item) if remote else 0)
+
+    def top(self, window="día", n=10):
+        current = self._current(window, time.time())
+        remote = self._remote(window, current["start"])
+        if not remote:
+            return current["top"].items()[:n]
+        candidates = {item for item, _ in current["top"].items()} | remote[2]
+        return sorted(((item, self.estimate(item, window)) for item in candidates), key=lambda item: -item[1])[:n]
+
+    def export(self):
+        """Ventanas actuales serializadas para publicarlas en la base compartida."""
+        now = time.time()
+        exported = []
+        for name in self.windows:
+            window = self._current(name, now)
+            exported.append((name, window["start"], window["sketch"].to_bytes(), [item for item, _ in window["top"].items()]))
+        return exported
+
+    def set_remote(self, window, start, rows):
+        """Suma las ventanas publicadas por los demás workers (pares de sketch serializado y top)."""
+        sketch, candidates = CountMinSketch(), set()
+        for data, top in rows:
+            sketch.merge_bytes(data)
+            candidates.update(top)
+        self.remote[window] = (start, sketch, candidates)
+
+# Pedidos de películas del catálogo (por clave) y de títulos que no tenemos
+demand_hits = DemandTracker("hits")
+demand_missing = DemandTracker("missing")
+
+def record_movie_request(title, record=None):
+    if record:
+        demand_hits.record(record.key)
+    else:
+        demand_missing.record(" ".join(title.lower().split()))
+
 # 4. Funciones auxiliares para la API de TMDB
+@profile_span("tmdb.search")
 def get_movie_id_by_title(title, year=None):
     url = f"{BASE_TMDB_URL}/search/movie"
     params = {"api_key": TMDB_API_KEY, "query": title, "language": "es-ES"}
@@ -118,6 +847,7 @@ def get_movie_id_by_title(title, year=None):
         logging.error(f"Error al buscar película en TMDB por título: {e}")
         return []
 
+@profile_span("tmdb.details")
 def get_movie_details(movie_id):
     url = f"{BASE_TMDB_URL}/movie/{movie_id}"
     params = {"api_key": TMDB_API_KEY, "language": "es-ES"}
@@ -129,9 +859,10 @@ def get_movie_details(movie_id):
         logging.error(f"Error al conectar con la API de TMDB: {e}")
         return None
 
-def get_popular_movies():
-    url = f"{BASE_TMDB_URL}/movie/popular"
-    params = {"api_key": TMDB_API_KEY, "language": "es-ES", "page": 1}
+@profile_span("tmdb.popular")
+def get_popular_movies(page=1, list_name="popular"):
+    url = f"{BASE_TMDB_URL}/movie/{list_name}"
+    params = {"api_key": TMDB_API_KEY, "language": "es-ES", "page": page}
     try:
         response = requests.get(url, params=params)
         response.raise_for_status()
@@ -140,6 +871,7 @@ def get_popular_movies():
         logging.error(f"Error al obtener películas populares de TMDB: {e}")
         return []
 
+@profile_span("trakt.search")
 def trakt_api_search_movie(title):
     headers = {
         "Content-Type": "application/json",
@@ -188,31 +920,77 @@ def create_movie_message(movie_data, movie_link=None):
 
     return text, poster_url
 
-# 6. Funciones de gestión de mensajes en el canal
-async def delete_old_post(movie_id_tmdb):
-    found_key = None
-    for key, data in movies_db.items():
-        if data.get("id") == movie_id_tmdb:
-            found_key = key
-            break
+# Teclado de las publicaciones del canal (igual para todas, se crea una sola vez)
+POST_KEYBOARD = types.InlineKeyboardMarkup(inline_keyboard=[
+    [types.InlineKeyboardButton(text="🎬 ¿Quieres pedir una película? Pídela aquí 👇", url="https://t.me/dylan_ad_bot")]
+])
+
+# Caché de publicaciones renderizadas por (ID de TMDB, enlace, versión de plantilla)
+rendered_posts = OrderedDict()
 
-    if found_key:
-        old_message_id = movies_db[found_key].get("last_message_id")
+def movie_data_fingerprint(movie_data):
+    """Campos de TMDB que usa la plantilla; si cambian, el post se vuelve a renderizar."""
+    return tuple(movie_data.get(field) for field in ("title", "overview", "release_date", "vote_average", "poster_path"))
+
+def render_movie_post(movie_data, movie_link=None):
+    """
+    Devuelve (texto, póster, teclado) de la publicación de una película,
+    reutilizando el resultado en caché mientras la película y la plantilla no cambien.
+    """
+    cache_key = (movie_data.get("id"), movie_link, POST_TEMPLATE_VERSION)
+    fingerprint = movie_data_fingerprint(movie_data)
+    cached = rendered_posts.get(cache_key)
+    if cached and cached[0] == fingerprint:
+        rendered_posts.move_to_end(cache_key)
+        return cached[1]
+
+    text, poster_url = create_movie_message(movie_data, movie_link)
+    rendered = (text, poster_url, POST_KEYBOARD)
+    rendered_posts[cache_key] = (fingerprint, rendered)
+    if len(rendered_posts) > RENDERED_POST_CACHE_SIZE:
+        rendered_posts.popitem(last=False)
+    return rendered
+
+def invalidate_rendered_posts(movie_id):
+    for cache_key in [k for k in rendered_posts if k[0] == movie_id]:
+        del rendered_posts[cache_key]
+
+# 6. Funciones de gestión de mensajes en el canal
+def post_hash(text, poster_url):
+    """Huella corta del texto y del póster de un post, por separado para saber si cambió el póster."""
+    def digest(value):
+        return hashlib.blake2b((value or "").encode("utf-8"), digest_size=6).hexdigest()
+    return f"{digest(text)}:{digest(poster_url)}"
+
+# Errores de edición que indican que el mensaje ya no existe o no admite el cambio: solo entonces se vuelve a publicar
+UNEDITABLE_POST_ERRORS = (
+    "message to edit not found",
+    "message can't be edited",
+    "message_id_invalid",
+    "there is no media in the message to edit",
+    "there is no caption in the message to edit",
+    "there is no text in the message to edit",
+)
+
+async def delete_old_post(movie_id_tmdb, chat_id=TELEGRAM_CHANNEL_ID, message_id=None):
+    record = get_movie_by_id(movie_id_tmdb)
+
+    if record:
+        old_message_id = message_id or record.message_ids.get(chat_id)
         if old_message_id:
             try:
-                await bot.delete_message(chat_id=TELEGRAM_CHANNEL_ID, message_id=old_message_id)
-                logging.info(f"Mensaje anterior con ID {old_message_id} de '{found_key}' eliminado.")
-                movies_db[found_key]["last_message_id"] = None
-                save_movies_db()
+                await bot.delete_message(chat_id=chat_id, message_id=old_message_id)
+                logging.info(f"Mensaje anterior con ID {old_message_id} de '{record.key}' eliminado del canal {chat_id}.")
+                # Si el nuevo post ya se envió, su ID reemplazó al anterior y no hay que quitarlo
+                if record.message_ids.get(chat_id) == old_message_id:
+                    record.message_ids.pop(chat_id, None)
+                    record.post_hashes.pop(chat_id, None)
+                    log_change("set_message_id", record.key, chat_id=chat_id, message_id=None)
             except Exception as e:
-                logging.error(f"Error al intentar borrar el mensaje {old_message_id}: {e}")
-
-async def send_movie_post(chat_id, movie_data, movie_link):
-    text, poster_url = create_movie_message(movie_data, movie_link)
+                logging.error(f"Error al intentar borrar el mensaje {old_message_id} del canal {chat_id}: {e}")
 
-    post_keyboard = types.InlineKeyboardMarkup(inline_keyboard=[
-        [types.InlineKeyboardButton(text="🎬 ¿Quieres pedir una película? Pídela aquí 👇", url="https://t.me/dylan_ad_bot")]
-    ])
+async def send_movie_post(chat_id, movie_data, movie_link, rendered=None):
+    text, poster_url, post_keyboard = rendered or render_movie_post(movie_data, movie_link)
 
     try:
         if poster_url:
@@ -229,17 +1007,116 @@ async def send_movie_post(chat_id, movie_data, movie_link):
                 reply_markup=post_keyboard
             )
 
-        if chat_id == TELEGRAM_CHANNEL_ID:
-            movie_key = next((k for k, v in movies_db.items() if movie_data.get("id") == v.get("id")), None)
-            if movie_key:
-                movies_db[movie_key]["last_message_id"] = message.message_id
-                save_movies_db()
+        if chat_id in TELEGRAM_CHANNEL_IDS:
+            record = get_movie_by_id(movie_data.get("id"))
+            if record:
+                published_hash = post_hash(text, poster_url)
+                record.message_ids[chat_id] = message.message_id
+                record.post_hashes[chat_id] = published_hash
+                log_change("set_message_id", record.key, chat_id=chat_id, message_id=message.message_id,
+                           post_hash=published_hash)
 
         return True, message.message_id
     except Exception as e:
-        logging.error(f"Error al enviar la publicación: {e}")
+        logging.error(f"Error al enviar la publicación al chat {chat_id}: {e}")
         return False, None
 
+async def edit_movie_post(record, chat_id, rendered):
+    """
+    Actualiza en el sitio el texto, el póster y el teclado de una publicación del canal.
+    Devuelve True si quedó al día, False si no se puede editar (mensaje borrado, foto
+    que pasaría a texto...) y hay que volver a publicarla, o None si falló por otro motivo.
+    """
+    text, poster_url, post_keyboard = rendered
+    message_id = record.message_ids[chat_id]
+    new_hash = post_hash(text, poster_url)
+    published = record.post_hashes.get(chat_id)
+    if published == new_hash:
+        return True
+    # Si no sabemos qué póster se publicó (por ejemplo, un post anterior a las huellas) se reemplaza junto con el texto
+    poster_changed = not published or published.split(":")[1] != new_hash.split(":")[1]
+    if published and poster_changed and not poster_url:
+        # Un mensaje con foto no se puede convertir en uno de solo texto
+        return False
+
+    for attempt in range(1, EDIT_MAX_ATTEMPTS + 1):
+        try:
+            if poster_url and poster_changed:
+                await bot.edit_message_media(
+                    chat_id=chat_id,
+                    message_id=message_id,
+                    media=types.InputMediaPhoto(media=poster_url, caption=text),
+                    reply_markup=post_keyboard
+                )
+            elif poster_url:
+                await bot.edit_message_caption(chat_id=chat_id, message_id=message_id, caption=text, reply_markup=post_keyboard)
+            else:
+                await bot.edit_message_text(chat_id=chat_id, message_id=message_id, text=text, reply_markup=post_keyboard)
+            break
+        except TelegramRetryAfter as e:
+            if attempt == EDIT_MAX_ATTEMPTS:
+                logging.error(f"No se pudo editar el mensaje {message_id} del canal {chat_id}: límite de Telegram.")
+                return None
+            await asyncio.sleep(e.retry_after)
+        except TelegramBadRequest as e:
+            if "message is not modified" in e.message:
+                break
+            logging.warning(f"No se pudo editar el mensaje {message_id} del canal {chat_id}: {e.message}")
+            if any(error in e.message.lower() for error in UNEDITABLE_POST_ERRORS):
+                return False
+            return None
+        except Exception as e:
+            # Errores de red y similares: el mensaje sigue ahí, no se vuelve a publicar
+            logging.error(f"Error al editar el mensaje {message_id} del canal {chat_id}: {e}")
+            return None
+    record.post_hashes[chat_id] = new_hash
+    log_change("set_post_hash", record.key, chat_id=chat_id, post_hash=new_hash)
+    logging.info(f"Mensaje {message_id} del canal {chat_id} actualizado sin volver a publicarlo.")
+    return True
+
+async def publish_movie(movie_data, movie_link, rendered=None, channel_ids=None, bump=True):
+    """
+    Publica la película en todos los canales configurados, atendiendo varios
+    canales a la vez. Con bump=True el post nuevo se envía mientras se borra el
+    anterior, para que quede al final del canal; con bump=False se edita el post
+    existente y solo se envía uno nuevo si no hay o no se puede editar.
+    Devuelve cuántos canales la recibieron y la lista de canales en los que falló.
+    """
+    channel_ids = channel_ids or TELEGRAM_CHANNEL_IDS
+    rendered = rendered or render_movie_post(movie_data, movie_link)
+    movie_id = movie_data.get("id")
+    record = get_movie_by_id(movie_id)
+    semaphore = asyncio.Semaphore(PUBLISH_CONCURRENCY)
+
+    async def publish_to(chat_id):
+        async with semaphore:
+            old_message_id = record.message_ids.get(chat_id) if record else None
+            if not old_message_id:
+                success, _ = await send_movie_post(chat_id, movie_data, movie_link, rendered)
+                return success
+            if not bump:
+                edited = await edit_movie_post(record, chat_id, rendered)
+                if edited is not False:
+                    # Con None el post sigue publicado pero no se pudo actualizar: cuenta como fallo
+                    return edited is True
+            _, (success, _) = await asyncio.gather(
+                delete_old_post(movie_id, chat_id, old_message_id),
+                send_movie_post(chat_id, movie_data, movie_link, rendered)
+            )
+            return success
+
+    results = await asyncio.gather(*(publish_to(chat_id) for chat_id in channel_ids))
+
+    failed = [chat_id for chat_id, success in zip(channel_ids, results) if not success]
+    if failed:
+        logging.warning(f"La película '{movie_data.get('title')}' no se pudo publicar en los canales: {failed}")
+    return len(channel_ids) - len(failed), failed
+
+def publish_result_text(sent, failed):
+    if not failed:
+        return "✅ Película publicada con éxito."
+    return f"✅ Película publicada en {sent} de {sent + len(failed)} canales."
+
 # 7. Manejadores de comandos y botones
 @dp.message(Command("start"))
 async def start_command(message: types.Message):
@@ -286,6 +1163,7 @@ async def delete_spam_message(message: types.Message):
         logging.error(f"No se pudo eliminar el mensaje de spam: {e}")
 
 @dp.message(F.text == "➕ Agregar película")
+@catalog_writer
 async def add_movie_start_by_text(message: types.Message, state: FSMContext):
     if str(message.from_user.id) != ADMIN_ID:
         await message.reply("No tienes permiso para esta acción.")
@@ -321,9 +1199,9 @@ async def send_catalog_page(chat_id, page):
     text = f"**Catálogo de Películas** (Página {page + 1}/{total_pages})\n\n"
     keyboard_buttons = []
 
-    for _, data in page_movies:
-        title = data.get("names")[0] if "names" in data and data.get("names") else "Título desconocido"
-        movie_id = data.get("id")
+    for _, record in page_movies:
+        title = record.title
+        movie_id = record.id
         keyboard_buttons.append([types.InlineKeyboardButton(text=f"Publicar '{title}'", callback_data=f"publish_from_catalog_{movie_id}")])
 
     pagination_buttons = []
@@ -347,25 +1225,24 @@ async def navigate_catalog(callback_query: types.CallbackQuery):
 
 # <--- NUEVA FUNCIÓN: Publicar película desde el catálogo
 @dp.callback_query(F.data.startswith("publish_from_catalog_"))
+@catalog_writer
 async def publish_from_catalog(callback_query: types.CallbackQuery):
     movie_id = int(callback_query.data.split("_")[-1])
 
-    movie_info = next((v for v in movies_db.values() if v['id'] == movie_id), None)
+    movie_info = get_movie_by_id(movie_id)
     if not movie_info:
         await bot.answer_callback_query(callback_query.id, "Error: película no encontrada en la base de datos.", show_alert=True)
         return
 
-    movie_data = get_movie_details(movie_id)
+    movie_data, rendered = await get_post_content(movie_info, attempts=1)
     if not movie_data:
         await bot.answer_callback_query(callback_query.id, "No se pudo obtener la información de la película. No se puede publicar.", show_alert=True)
         return
 
-    await delete_old_post(movie_id)
-
-    success, _ = await send_movie_post(TELEGRAM_CHANNEL_ID, movie_data, movie_info.get("link"))
+    sent, failed = await publish_movie(movie_data, movie_info.link, rendered)
 
-    if success:
-        await bot.answer_callback_query(callback_query.id, "✅ Película publicada con éxito.", show_alert=True)
+    if sent:
+        await bot.answer_callback_query(callback_query.id, publish_result_text(sent, failed), show_alert=True)
     else:
         await bot.answer_callback_query(callback_query.id, "Ocurrió un error al publicar la película.", show_alert=True)
 
@@ -380,8 +1257,8 @@ async def view_movies_by_text(message: types.Message):
         return
 
     movie_lines = []
-    for main_title, data in movies_db.items():
-        names = data.get("names", [])
+    for main_title, record in movies_db.items():
+        names = record.names
         if names:
             main_name = names[0]
             other_names = names[1:]
@@ -396,6 +1273,7 @@ async def view_movies_by_text(message: types.Message):
     await message.reply(f"Películas en la base de datos:\n\n{movie_list}")
 
 @dp.message(F.text == "⚙️ Configuración auto-publicación")
+@catalog_writer
 async def auto_post_config(message: types.Message, state: FSMContext):
     if str(message.from_user.id) != ADMIN_ID:
         await message.reply("No tienes permiso para esta acción.")
@@ -410,9 +1288,12 @@ async def auto_post_config(message: types.Message, state: FSMContext):
     await message.reply("Elige cuántas películas quieres que se publiquen automáticamente cada día:", reply_markup=keyboard)
 
 @dp.callback_query(F.data.startswith("set_auto_"))
+@catalog_writer
 async def set_auto_post_count(callback_query: types.CallbackQuery):
     global AUTO_POST_COUNT
     AUTO_POST_COUNT = int(callback_query.data.split("_")[2])
+    if shared_store:
+        await asyncio.to_thread(shared_store.set_setting, "auto_post_count", AUTO_POST_COUNT)
 
     await bot.answer_callback_query(callback_query.id, f"Publicación automática configurada para {AUTO_POST_COUNT} películas al día.")
     await bot.edit_message_text(
@@ -422,6 +1303,7 @@ async def set_auto_post_count(callback_query: types.CallbackQuery):
     )
 
 @dp.message(MovieUploadStates.waiting_for_movie_info)
+@catalog_writer
 async def add_movie_info(message: types.Message, state: FSMContext):
     if str(message.from_user.id) != ADMIN_ID:
         await message.reply("No tienes permiso para usar esta función.")
@@ -450,7 +1332,7 @@ async def add_movie_info(message: types.Message, state: FSMContext):
 
     await message.reply(f"Buscando '{main_title}' del año {year} en TMDB...")
 
-    movie_id = get_movie_id_by_title(main_title, year)
+    movie_id = await asyncio.to_thread(get_movie_id_by_title, main_title, year)
     if not movie_id:
         await message.reply(
             f"No se pudo encontrar la película '{main_title}' del año {year} en TMDB. "
@@ -458,13 +1340,7 @@ async def add_movie_info(message: types.Message, state: FSMContext):
         )
         return
 
-    movies_db[main_title.lower()] = {
-        "names": names,
-        "id": movie_id,
-        "link": movie_link,
-        "last_message_id": None
-    }
-    save_movies_db()
+    upsert_movie(main_title, names, movie_id, movie_link)
 
     keyboard = types.InlineKeyboardMarkup(inline_keyboard=[
         [types.InlineKeyboardButton(text="➕ Agregar otra película", callback_data="add_movie_again")],
@@ -474,6 +1350,7 @@ async def add_movie_info(message: types.Message, state: FSMContext):
     await message.reply("✅ Tu película fue agregada correctamente. ¿Qué quieres hacer ahora?", reply_markup=keyboard)
 
 @dp.callback_query(F.data == "add_movie_again")
+@catalog_writer
 async def add_movie_again_callback(callback_query: types.CallbackQuery, state: FSMContext):
     await bot.answer_callback_query(callback_query.id)
     await bot.send_message(
@@ -483,25 +1360,30 @@ async def add_movie_again_callback(callback_query: types.CallbackQuery, state: F
     await state.set_state(MovieUploadStates.waiting_for_movie_info)
 
 @dp.callback_query(F.data.startswith("publish_now_"))
+@catalog_writer
 async def publish_now_callback(callback_query: types.CallbackQuery):
     movie_id = int(callback_query.data.split("_")[2])
 
-    movie_data = get_movie_details(movie_id)
+    movie_info = get_movie_by_id(movie_id)
+    if not movie_info:
+        await bot.answer_callback_query(callback_query.id, "Error: película no encontrada en la base de datos.", show_alert=True)
+        return
+
+    movie_data, rendered = await get_post_content(movie_info, attempts=1)
     if not movie_data:
         await bot.answer_callback_query(callback_query.id, "No se pudo obtener la información de la película. No se puede publicar.", show_alert=True)
         return
 
-    await delete_old_post(movie_id)
+    sent, failed = await publish_movie(movie_data, movie_info.link, rendered)
 
-    success, _ = await send_movie_post(TELEGRAM_CHANNEL_ID, movie_data, next(v['link'] for v in movies_db.values() if v['id'] == movie_id))
-
-    if success:
-        await bot.answer_callback_query(callback_query.id, "✅ Película publicada con éxito.", show_alert=True)
+    if sent:
+        await bot.answer_callback_query(callback_query.id, publish_result_text(sent, failed), show_alert=True)
         await bot.delete_message(chat_id=callback_query.message.chat.id, message_id=callback_query.message.message_id)
     else:
         await bot.answer_callback_query(callback_query.id, "Ocurrió un error al publicar la película.", show_alert=True)
 
 @dp.callback_query(F.data.startswith("schedule_"))
+@catalog_writer
 async def schedule_callback(callback_query: types.CallbackQuery):
     movie_id = int(callback_query.data.split("_")[1])
 
@@ -519,6 +1401,7 @@ async def schedule_callback(callback_query: types.CallbackQuery):
     await bot.delete_message(chat_id=callback_query.message.chat.id, message_id=callback_query.message.message_id)
 
 @dp.callback_query(F.data.startswith("schedule_"))
+@catalog_writer
 async def final_schedule_callback(callback_query: types.CallbackQuery):
     parts = callback_query.data.split("_")
     delay_type = parts[1]
@@ -530,12 +1413,12 @@ async def final_schedule_callback(callback_query: types.CallbackQuery):
     elif delay_type == "1h":
         delay_minutes = 60
 
-    movie_info = next((v for v in movies_db.values() if v['id'] == movie_id), None)
+    movie_info = get_movie_by_id(movie_id)
     if not movie_info:
         await bot.answer_callback_query(callback_query.id, "Error: película no encontrada en la base de datos.", show_alert=True)
         return
 
-    await scheduled_posts.put((movie_info, delay_minutes))
+    await enqueue_scheduled_post(movie_info, delay_minutes)
 
     await bot.answer_callback_query(callback_query.id, f"✅ Publicación programada para dentro de {delay_minutes} minutos.", show_alert=True)
     await bot.edit_message_text(
@@ -551,20 +1434,32 @@ async def show_estrenos_callback(callback_query: types.CallbackQuery):
         await bot.answer_callback_query(callback_query.id, "Aún no hay películas en el catálogo. ¡Pronto habrá!", show_alert=True)
         return
 
+    refresh_popular_cross()
+    if popular_in_catalog:
+        text = "**🎞️ ¡Estrenos!**\n\nEstas películas populares ya están en nuestro catálogo. Si quieres ver una, solo escribe su nombre completo.\n\n"
+        for movie in popular_in_catalog[:10]:
+            text += f"- {movie.title}\n"
+
+        keyboard = types.InlineKeyboardMarkup(inline_keyboard=[
+            [types.InlineKeyboardButton(text="📽️ Pedir una película", callback_data="ask_for_movie")]
+        ])
+        await bot.answer_callback_query(callback_query.id)
+        await bot.send_message(callback_query.message.chat.id, text, reply_markup=keyboard, parse_mode=ParseMode.MARKDOWN)
+        return
+
     # Ordenar las películas por last_message_id, moviendo los None al final
-    sorted_movies = sorted(movies_db.values(), key=lambda x: x.get('last_message_id', float('-inf')), reverse=True)
+    sorted_movies = sorted(movies_db.values(), key=lambda x: x.last_message_id if x.last_message_id is not None else float('-inf'), reverse=True)
     recent_movies = sorted_movies[:10]
 
     text = "**🎞️ ¡Estrenos!**\n\nAquí tienes las últimas películas publicadas en el canal. Si quieres ver una, solo escribe su nombre completo.\n\n"
 
-    if not recent_movies or all(m.get('last_message_id') is None for m in recent_movies):
+    if not recent_movies or all(m.last_message_id is None for m in recent_movies):
       text = "**🎞️ ¡Estrenos!**\n\nNo hay estrenos recientes publicados en el canal, pero aquí tienes una lista de películas de nuestra base de datos que podrían interesarte.\n\n"
       recent_movies = random.sample(list(movies_db.values()), min(len(movies_db), 10))
 
 
     for movie in recent_movies:
-        title = movie.get("names")[0] if "names" in movie and movie.get("names") else "Título desconocido"
-        text += f"- {title}\n"
+        text += f"- {movie.title}\n"
 
     keyboard = types.InlineKeyboardMarkup(inline_keyboard=[
         [types.InlineKeyboardButton(text="📽️ Pedir una película", callback_data="ask_for_movie")]
@@ -588,9 +1483,10 @@ async def process_movie_request(message: types.Message, state: FSMContext):
     await state.clear()
 
     main_title, movie_info = find_movie_in_db(movie_title)
+    record_movie_request(movie_title, movie_info)
 
     if not movie_info:
-        trakt_id = trakt_api_search_movie(movie_title)
+        trakt_id = await asyncio.to_thread(trakt_api_search_movie, movie_title)
 
         if trakt_id:
             keyboard = types.InlineKeyboardMarkup(inline_keyboard=[
@@ -637,25 +1533,41 @@ async def process_movie_request(message: types.Message, state: FSMContext):
             )
         return
 
-    movie_id = movie_info.get("id")
-    movie_link = movie_info.get("link")
+    movie_id = movie_info.id
+    movie_link = movie_info.link
 
     if not movie_id or not movie_link:
         await message.reply("Ocurrió un error. El administrador debe volver a subirla. Intenta contactarlo.")
         return
 
-    movie_data = get_movie_details(movie_id)
+    if movie_info.link_alive is False:
+        await bot.send_message(
+            ADMIN_ID,
+            f"⚠️ El usuario {message.from_user.full_name} (@{message.from_user.username}) pidió <b>{movie_info.title}</b>, "
+            f"pero su enlace está caído: {movie_link}",
+            parse_mode=ParseMode.HTML,
+            disable_web_page_preview=True
+        )
+        await message.reply("Esa película está en el catálogo, pero su enlace se está revisando. El administrador ha sido notificado. ¡Pronto estará lista!")
+        return
+
+    movie_data, rendered = await get_post_content(movie_info, attempts=1)
     if not movie_data:
         await message.reply(
             "Lo siento, hubo un problema al obtener la información de la película. Por favor, intenta de nuevo más tarde."
         )
         return
 
-    await delete_old_post(movie_data.get("id"))
+    if catalog_follower:
+        # La instancia espejo no publica en los canales: envía la publicación solo a quien la pidió
+        sent, _ = await send_movie_post(message.chat.id, movie_data, movie_link, rendered)
+        if not sent:
+            await message.reply("Ocurrió un error al enviarte la película. Por favor, intenta de nuevo más tarde.")
+        return
 
-    success, _ = await send_movie_post(TELEGRAM_CHANNEL_ID, movie_data, movie_link)
+    sent, _ = await publish_movie(movie_data, movie_link, rendered)
 
-    if success:
+    if sent:
         keyboard = types.InlineKeyboardMarkup(inline_keyboard=[
             [types.InlineKeyboardButton(text="📽️ Pedir otra película", callback_data="ask_for_movie")]
         ])
@@ -667,6 +1579,7 @@ async def process_movie_request(message: types.Message, state: FSMContext):
         await message.reply("Ocurrió un error al intentar publicar la película. Por favor, contacta al administrador.")
 
 @dp.callback_query(F.data.startswith("publish_now_from_trakt_"))
+@catalog_writer
 async def publish_from_trakt(callback_query: types.CallbackQuery, state: FSMContext):
     if str(callback_query.from_user.id) != ADMIN_ID:
         await bot.answer_callback_query(callback_query.id, "No tienes permiso para esta acción.")
@@ -676,7 +1589,7 @@ async def publish_from_trakt(callback_query: types.CallbackQuery, state: FSMCont
     tmdb_id = int(parts[3])
     user_id = int(parts[4])
 
-    movie_data = get_movie_details(tmdb_id)
+    movie_data = await fetch_movie_details_with_retry(tmdb_id, attempts=1)
     if not movie_data:
         await bot.answer_callback_query(callback_query.id, "No se pudo obtener la información completa de la película desde TMDB.", show_alert=True)
         return
@@ -694,6 +1607,7 @@ async def publish_from_trakt(callback_query: types.CallbackQuery, state: FSMCont
     await state.set_state(MovieUploadStates.waiting_for_requested_movie_link)
 
 @dp.callback_query(F.data.startswith("add_requested_"))
+@catalog_writer
 async def add_requested_movie_callback(callback_query: types.CallbackQuery, state: FSMContext):
     if str(callback_query.from_user.id) != ADMIN_ID:
         await bot.answer_callback_query(callback_query.id, "No tienes permiso para esta acción.")
@@ -703,7 +1617,7 @@ async def add_requested_movie_callback(callback_query: types.CallbackQuery, stat
     requested_title = parts[2]
     user_id = int(parts[3])
 
-    movie_id = get_movie_id_by_title(requested_title)
+    movie_id = await asyncio.to_thread(get_movie_id_by_title, requested_title)
     if not movie_id:
         await bot.send_message(callback_query.from_user.id, "No se pudo encontrar la película en TMDB. No se puede continuar.")
         return
@@ -717,6 +1631,7 @@ async def add_requested_movie_callback(callback_query: types.CallbackQuery, stat
     await state.set_state(MovieUploadStates.waiting_for_requested_movie_link)
 
 @dp.message(MovieUploadStates.waiting_for_requested_movie_link)
+@catalog_writer
 async def process_requested_movie_link(message: types.Message, state: FSMContext):
     if str(message.from_user.id) != ADMIN_ID:
         await message.reply("No tienes permiso para usar esta función.")
@@ -735,7 +1650,7 @@ async def process_requested_movie_link(message: types.Message, state: FSMContext
         await state.clear()
         return
 
-    movie_data = get_movie_details(tmdb_id)
+    movie_data = await fetch_movie_details_with_retry(tmdb_id, attempts=1)
     if not movie_data:
         await message.reply("No se pudo obtener la información de la película desde TMDB. No se puede guardar.")
         await state.clear()
@@ -746,13 +1661,7 @@ async def process_requested_movie_link(message: types.Message, state: FSMContext
     if movie_data.get("original_title") != main_title:
         names.append(movie_data.get("original_title"))
 
-    movies_db[main_title.lower()] = {
-        "names": names,
-        "id": tmdb_id,
-        "link": movie_link,
-        "last_message_id": None
-    }
-    save_movies_db()
+    upsert_movie(main_title, names, tmdb_id, movie_link)
 
     await state.clear()
 
@@ -765,6 +1674,7 @@ async def process_requested_movie_link(message: types.Message, state: FSMContext
 
 
 @dp.callback_query(F.data.startswith("publish_requested_"))
+@catalog_writer
 async def publish_requested_movie(callback_query: types.CallbackQuery):
     if str(callback_query.from_user.id) != ADMIN_ID:
         await bot.answer_callback_query(callback_query.id, "No tienes permiso para esta acción.")
@@ -774,22 +1684,20 @@ async def publish_requested_movie(callback_query: types.CallbackQuery):
     tmdb_id = int(parts[2])
     user_request_id = int(parts[3])
 
-    movie_info = next((v for v in movies_db.values() if v['id'] == tmdb_id), None)
+    movie_info = get_movie_by_id(tmdb_id)
     if not movie_info:
         await bot.answer_callback_query(callback_query.id, "Error: película no encontrada en la base de datos.", show_alert=True)
         return
 
-    movie_data = get_movie_details(tmdb_id)
+    movie_data, rendered = await get_post_content(movie_info, attempts=1)
     if not movie_data:
         await bot.answer_callback_query(callback_query.id, "No se pudo obtener la información de la película. No se puede publicar.", show_alert=True)
         return
 
-    await delete_old_post(tmdb_id)
-
-    success, _ = await send_movie_post(TELEGRAM_CHANNEL_ID, movie_data, movie_info.get("link"))
+    sent, failed = await publish_movie(movie_data, movie_info.link, rendered)
 
-    if success:
-        await bot.answer_callback_query(callback_query.id, "✅ Película publicada con éxito.", show_alert=True)
+    if sent:
+        await bot.answer_callback_query(callback_query.id, publish_result_text(sent, failed), show_alert=True)
         if user_request_id:
             try:
                 await bot.send_message(
@@ -813,7 +1721,7 @@ async def notify_user(callback_query: types.CallbackQuery):
     user_request_id = int(parts[2])
     tmdb_id = int(parts[3])
 
-    movie_data = get_movie_details(tmdb_id)
+    movie_data = await fetch_movie_details_with_retry(tmdb_id, attempts=1)
     if not movie_data:
         await bot.answer_callback_query(callback_query.id, "No se pudo obtener la información de la película. No se puede notificar.", show_alert=True)
         return
@@ -834,24 +1742,751 @@ async def notify_user(callback_query: types.CallbackQuery):
         await bot.answer_callback_query(callback_query.id, "Ocurrió un error al notificar al usuario.", show_alert=True)
         logging.error(f"Error al notificar al usuario {user_request_id}: {e}")
 
+# Precarga de publicaciones programadas y automáticas
+auto_post_candidates = deque()
+scheduled_prefetch_ids = set()
+prefetched_posts = {}
+
+async def fetch_movie_details_with_retry(movie_id, attempts=PREFETCH_MAX_ATTEMPTS):
+    """
+    Consulta TMDB fuera del bucle de eventos y reintenta con espera exponencial.
+    """
+    for attempt in range(attempts):
+        movie_data = await asyncio.to_thread(get_movie_details, movie_id)
+        if movie_data:
+            return movie_data
+        if attempt + 1 < attempts:
+            delay = PREFETCH_BASE_DELAY * 2 ** attempt + random.uniform(0, 1)
+            logging.warning(f"Reintentando la consulta de la película {movie_id} en {delay:.1f} s.")
+            await asyncio.sleep(delay)
+    return None
+
+def refill_auto_post_candidates():
+    """Elige por adelantado las próximas películas de la publicación automática."""
+    # Descarta candidatos que se editaron o eliminaron del catálogo
+    for record in [m for m in auto_post_candidates if movies_db.get(m.key) is not m]:
+        auto_post_candidates.remove(record)
+    if len(auto_post_candidates) >= AUTO_POST_PREFETCH_COUNT:
+        return
+    excluded = {p.id for p in recent_posts} | {m.id for m in auto_post_candidates}
+    # Se sortea entre una muestra acotada del catálogo más los títulos más pedidos, no entre todo el catálogo
+    pool = {m.key: m for m in random.sample(list(movies_db.values()), min(len(movies_db), AUTO_POST_CANDIDATE_SAMPLE))}
+    if AUTO_POST_DEMAND_WEIGHTING:
+        for key, _ in demand_hits.top("día", DEMAND_TOP_K):
+            if key in movies_db:
+                pool[key] = movies_db[key]
+    available_movies = [m for m in pool.values() if m.id not in excluded and m.link_alive is not False]
+    if AUTO_POST_DEMAND_WEIGHTING:
+        # Muestreo ponderado sin reemplazo: las películas más pedidas hoy salen antes
+        available_movies.sort(key=lambda m: random.random() ** (1 / (1 + demand_hits.estimate(m.key))))
+    else:
+        random.shuffle(available_movies)
+    while len(auto_post_candidates) < AUTO_POST_PREFETCH_COUNT and available_movies:
+        auto_post_candidates.append(available_movies.pop())
+
+async def prefetch_post(record):
+    cached = prefetched_posts.get(record.id)
+    if cached and time.time() - cached["fetched_at"] < PREFETCH_TTL:
+        return cached
+    movie_data = await fetch_movie_details_with_retry(record.id)
+    if not movie_data:
+        logging.error(f"No se pudo precargar la película con ID {record.id}.")
+        return None
+    cached = {
+        "movie_data": movie_data,
+        "link": record.link,
+        "rendered": render_movie_post(movie_data, record.link),
+        "fetched_at": time.time(),
+    }
+    prefetched_posts[record.id] = cached
+    return cached
+
+async def get_post_content(record, attempts=PREFETCH_MAX_ATTEMPTS):
+    """
+    Devuelve los datos de TMDB y el mensaje ya renderizado de una película,
+    usando la precarga si existe. Si el enlace cambió, solo se vuelve a renderizar.
+    """
+    cached = prefetched_posts.pop(record.id, None)
+    if cached is None or time.time() - cached["fetched_at"] >= PREFETCH_TTL:
+        movie_data = await fetch_movie_details_with_retry(record.id, attempts)
+        if not movie_data:
+            return None, None
+        return movie_data, render_movie_post(movie_data, record.link)
+    if cached["link"] != record.link:
+        return cached["movie_data"], render_movie_post(cached["movie_data"], record.link)
+    return cached["movie_data"], cached["rendered"]
+
+async def prefetch_task():
+    """
+    Tarea asincrónica que prepara con antelación el contenido de las próximas
+    publicaciones programadas y automáticas.
+    """
+    while True:
+        try:
+            refill_auto_post_candidates()
+            scheduled_ids = set(scheduled_prefetch_ids)
+            if shared_store:
+                scheduled_ids |= await asyncio.to_thread(shared_store.scheduled_movie_ids)
+            targets = [get_movie_by_id(movie_id) for movie_id in scheduled_ids]
+            targets.extend(auto_post_candidates)
+            for record in targets:
+                if record:
+                    await prefetch_post(record)
+        except Exception as e:
+            logging.error(f"Error en la tarea de precarga: {e}")
+
+        await asyncio.sleep(60)
+
+# Auditoría de enlaces de descarga
+async def probe_link(session, link):
+    """
+    Comprueba un enlace del catálogo. Se considera caído si responde con error,
+    si redirige a una página de error o si el contenido indica que ya no existe.
+    Si no se puede conectar, el resultado queda como desconocido (None).
+    """
+    result = {"alive": None, "status": None, "checked_at": time.time()}
+    try:
+        async with session.get(link, allow_redirects=True) as response:
+            result["status"] = response.status
+            if response.status >= 400:
+                result["alive"] = False
+                return result
+            body = (await response.content.read(64 * 1024)).decode("utf-8", errors="ignore").lower()
+            final_url = str(response.url).lower()
+            result["alive"] = not (
+                any(marker in final_url for marker in DEAD_LINK_URL_MARKERS)
+                or any(marker in body for marker in DEAD_LINK_BODY_MARKERS)
+            )
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        logging.warning(f"No se pudo comprobar el enlace {link}: {e}")
+    return result
+
+async def audit_links(records=None, force=False, job=None):
+    """
+    Sondea los enlaces del catálogo con concurrencia limitada y una sesión HTTP
+    compartida, espaciando el inicio de cada sondeo. Devuelve los registros con
+    enlaces caídos. Si se ejecuta como trabajo, informa del progreso de cada sondeo.
+    """
+    all_records = list(movies_db.values()) if records is None else records
+    now = time.time()
+    # El resultado de cada sondeo se guarda en el registro; solo se repiten los vencidos
+    records = [
+        record for record in all_records
+        if record.link and (force or record.link_checked_at is None or now - record.link_checked_at >= LINK_STATUS_TTL)
+    ]
+    links = {record.link for record in records}
+    link_status = {}
+    if job:
+        job.total = len(links)
+    semaphore = asyncio.Semaphore(LINK_AUDIT_CONCURRENCY)
+    connector = aiohttp.TCPConnector(limit=LINK_AUDIT_CONCURRENCY)
+    timeout = aiohttp.ClientTimeout(total=LINK_AUDIT_TIMEOUT)
+
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        async def check(link):
+            async with semaphore:
+                link_status[link] = await probe_link(session, link)
+            if job:
+                await job_runner.progress(job, link if link_status[link]["alive"] is False else None)
+
+        tasks = []
+        try:
+            for link in links:
+                tasks.append(asyncio.create_task(check(link)))
+                await asyncio.sleep(LINK_AUDIT_SPACING)
+            await asyncio.gather(*tasks)
+        except asyncio.CancelledError:
+            for task in tasks:
+                task.cancel()
+            raise
+
+    for record in records:
+        status = link_status.get(record.link)
+        if not status:
+            continue
+        # Un resultado desconocido no cambia el estado guardado, pero sí cuenta como sondeo
+        if status["alive"] is not None:
+            record.link_alive = status["alive"]
+        record.link_checked_at = status["checked_at"]
+        log_change("set_link_alive", record.key, alive=record.link_alive, checked_at=record.link_checked_at)
+
+    logging.info(f"Auditoría de enlaces completada: {len(links)} enlaces comprobados.")
+    return [record for record in all_records if record.link_alive is False]
+
+def next_link_audit_delay(now=None):
+    """
+    Segundos hasta que venza el resultado más antiguo del catálogo. Sin sondeos
+    previos la auditoría empieza enseguida.
+    """
+    now = time.time() if now is None else now
+    checked = [record.link_checked_at for record in movies_db.values() if record.link_checked_at is not None]
+    if not checked:
+        return 0
+    return max(0, min(checked) + LINK_STATUS_TTL - now)
+
+async def send_link_audit_summary(dead_records, total):
+    text = f"🔗 <b>Auditoría de enlaces</b>\n\nPelículas revisadas: {total}\nEnlaces caídos: {len(dead_records)}"
+    if dead_records:
+        text += "\n\n" + "\n".join(f"- {record.title}: {record.link}" for record in dead_records)
+    await bot.send_message(ADMIN_ID, text, parse_mode=ParseMode.HTML, disable_web_page_preview=True)
+
+async def link_audit_task():
+    """
+    Tarea asincrónica que audita periódicamente los enlaces del catálogo y
+    envía un resumen al administrador. Al arrancar espera a que venzan los
+    resultados guardados, para no repetir la auditoría en cada reinicio.
+    """
+    delay = next_link_audit_delay()
+    if delay:
+        logging.info(f"Próxima auditoría de enlaces en {delay / 3600:.1f} h.")
+        await asyncio.sleep(delay)
+    while True:
+        try:
+            dead_records = await audit_links()
+            await send_link_audit_summary(dead_records, len(movies_db))
+        except Exception as e:
+            logging.error(f"Error en la auditoría de enlaces: {e}")
+
+        await asyncio.sleep(LINK_AUDIT_INTERVAL)
+
+@dp.message(Command("auditar_enlaces"))
+@catalog_writer
+async def audit_links_command(message: types.Message):
+    if str(message.from_user.id) != ADMIN_ID:
+        await message.reply("No tienes permiso para esta acción.")
+        return
+
+    await job_runner.submit("link_audit", message.chat.id)
+
+@dp.message(Command("demanda"))
+async def demand_command(message: types.Message):
+    if str(message.from_user.id) != ADMIN_ID:
+        await message.reply("No tienes permiso para esta acción.")
+        return
+
+    text = "📈 <b>Películas más pedidas que no están en el catálogo</b>"
+    # En modo multiproceso incluye lo publicado por los demás workers hasta hace DEMAND_SYNC_INTERVAL segundos
+    for window, label in (("hora", "Esta hora"), ("día", "Hoy")):
+        top = demand_missing.top(window)
+        text += f"\n\n<b>{label}:</b>\n"
+        text += "\n".join(f"{i}. {html.escape(title)} ({count})" for i, (title, count) in enumerate(top, start=1)) if top else "Sin solicitudes."
+    await message.reply(text, parse_mode=ParseMode.HTML)
+
+@dp.message(Command("perfilar"))
+async def profile_command(message: types.Message):
+    if str(message.from_user.id) != ADMIN_ID:
+        await message.reply("No tienes permiso para esta acción.")
+        return
+
+    parts = message.text.split()
+    count = int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else 20
+    count = max(1, min(count, 500))
+    profiler.start_capture(count, message.chat.id)
+    await message.reply(f"📊 Se perfilarán las próximas {count} actualizaciones. Te enviaré el resultado al terminar.")
+
+# Cambios del catálogo: corrección de enlaces, eliminación y recuperación en un momento dado
+@dp.message(Command("cambiar_enlace"))
+@catalog_writer
+async def change_link_command(message: types.Message, command: CommandObject):
+    if str(message.from_user.id) != ADMIN_ID:
+        await message.reply("No tienes permiso para esta acción.")
+        return
+
+    parts = (command.args or "").split()
+    if len(parts) != 2 or not parts[0].isdigit():
+        await message.reply("Uso: /cambiar_enlace <ID de TMDB> <nuevo enlace>")
+        return
+    record = get_movie_by_id(int(parts[0]))
+    if not record:
+        await message.reply("❌ Esa película no está en el catálogo.")
+        return
+    update_movie_link(record, parts[1])
+    edited = 0
+    channel_ids = [chat_id for chat_id in record.message_ids if chat_id in TELEGRAM_CHANNEL_IDS]
+    if channel_ids:
+        movie_data, rendered = await get_post_content(record, attempts=1)
+        if movie_data:
+            edited, _ = await publish_movie(movie_data, record.link, rendered, channel_ids, bump=False)
+    await message.reply(f"✅ Enlace de '{record.title}' actualizado en el catálogo y en {edited} publicaciones del canal.")
+
+@dp.message(Command("eliminar"))
+@catalog_writer
+async def delete_movie_command(message: types.Message, command: CommandObject):
+    if str(message.from_user.id) != ADMIN_ID:
+        await message.reply("No tienes permiso para esta acción.")
+        return
+
+    movie_id = (command.args or "").strip()
+    record = get_movie_by_id(int(movie_id)) if movie_id.isdigit() else None
+    if not record:
+        await message.reply("Uso: /eliminar <ID de TMDB de una película del catálogo>")
+        return
+    delete_movie(record)
+    await message.reply(f"🗑️ '{record.title}' se eliminó del catálogo. Puedes recuperarla con /restaurar.")
+
+def restore_catalog(until_ts):
+    """
+    Reconstruye el catálogo tal como estaba en until_ts y registra la diferencia
+    con el actual como cambios nuevos, así la recuperación también queda en el historial.
+    Devuelve (agregadas o cambiadas, eliminadas) o None si no hay historial suficiente.
+    """
+    base_path, entries = catalog_journal.history_until(until_ts)
+    if base_path is None:
+        return None
+    restored = read_catalog_snapshot(base_path)
+    for entry in entries:
+        apply_journal_entry(restored, entry)
+
+    removed = [record for key, record in list(movies_db.items()) if key not in restored]
+    for record in removed:
+        delete_movie(record)
+    changed = 0
+    for key, record in restored.items():
+        current = movies_db.get(key)
+        if current and current.to_dict() == record.to_dict():
+            continue
+        replace_movie_record(key, record)
+        log_change("insert", key, data=record.to_dict())
+        changed += 1
+    return changed, len(removed)
+
+@dp.message(Command("restaurar"))
+@catalog_writer
+async def restore_catalog_command(message: types.Message, command: CommandObject):
+    if str(message.from_user.id) != ADMIN_ID:
+        await message.reply("No tienes permiso para esta acción.")
+        return
+    if not catalog_journal:
+        await message.reply("La recuperación solo está disponible en la instancia principal de un solo proceso.")
+        return
+
+    try:
+        until = datetime.datetime.strptime((command.args or "").strip(), "%Y-%m-%d %H:%M")
+    except ValueError:
+        await message.reply("Uso: /restaurar AAAA-MM-DD HH:MM")
+        return
+    result = restore_catalog(until.timestamp())
+    if result is None:
+        await message.reply("❌ El historial guardado no llega hasta esa fecha.")
+        return
+    changed, removed = result
+    await message.reply(
+        f"♻️ Catálogo restaurado al {until:%Y-%m-%d %H:%M}: {changed} películas recuperadas o cambiadas, {removed} eliminadas."
+    )
+
+async def catalog_follow_task():
+    """Aplica en la instancia espejo los cambios que registra la instancia principal."""
+    global popular_stale
+    while True:
+        try:
+            for entry in catalog_follower.poll():
+                apply_followed_entry(entry)
+        except JournalGap as e:
+            # Los segmentos que faltan ya se podaron: se vuelve a cargar desde la última instantánea
+            logging.warning(f"Registro de cambios del catálogo incompleto ({e}); se recarga la última instantánea.")
+            try:
+                load_movies_db()
+                rendered_posts.clear()
+                popular_stale = True
+                await build_catalog_indexes()
+            except Exception as e:
+                logging.error(f"Error al recargar el catálogo de la instancia principal: {e}")
+        except Exception as e:
+            logging.error(f"Error al seguir el registro de cambios del catálogo: {e}")
+        await asyncio.sleep(JOURNAL_FOLLOW_INTERVAL)
+
+# Sincronización de películas populares de TMDB con el catálogo
+popular_ranked = []
+popular_in_catalog = []
+popular_missing = []
+# Se marca al cambiar el catálogo para repetir el cruce la próxima vez que se consulte
+popular_stale = False
+
+def cross_popular_with_catalog(ranked):
+    """
+    Cruza la lista de populares con el catálogo en una sola pasada por ID.
+    Guarda las populares que ya tenemos y, ordenadas por popularidad, las que faltan.
+    """
+    global popular_ranked, popular_in_catalog, popular_missing, popular_stale
+    by_id = movies_by_id if catalog_indexed else {record.id: record for record in movies_db.values()}
+    in_catalog, missing = [], []
+    for result in ranked:
+        record = by_id.get(result["id"])
+        if record:
+            in_catalog.append(record)
+        else:
+            missing.append(result)
+    popular_ranked, popular_in_catalog, popular_missing = ranked, in_catalog, missing
+    popular_stale = False
+
+def refresh_popular_cross():
+    """Repite el cruce con la última lista de populares si el catálogo cambió desde entonces."""
+    if popular_stale:
+        cross_popular_with_catalog(popular_ranked)
+
+async def sync_popular_movies():
+    """
+    Descarga a la vez varias páginas de las listas de TMDB, las ordena por
+    popularidad y las cruza con el catálogo. En modo multiproceso comparte la
+    lista con los demás workers.
+    """
+    pages = await asyncio.gather(*(
+        asyncio.to_thread(get_popular_movies, page, list_name)
+        for list_name in POPULAR_SYNC_LISTS
+        for page in range(1, POPULAR_SYNC_PAGES + 1)
+    ))
+
+    # Una misma película puede aparecer en varias listas; se queda la mayor popularidad
+    popular = {}
+    for result in (result for page in pages for result in page):
+        movie_id = result.get("id")
+        if movie_id and result.get("popularity", 0) >= popular.get(movie_id, {}).get("popularity", 0):
+            popular[movie_id] = result
+    ranked = sorted(popular.values(), key=lambda result: result.get("popularity", 0), reverse=True)
+    # Solo los campos que se usan, para compartir la lista sin el resto de la respuesta
+    ranked = [
+        {field: result.get(field) for field in ("id", "title", "original_title", "release_date", "popularity")}
+        for result in ranked
+    ]
+    if shared_store:
+        await asyncio.to_thread(shared_store.set_setting, "popular_movies", {"synced_at": time.time(), "ranked": ranked})
+    cross_popular_with_catalog(ranked)
+    logging.info(f"Populares sincronizadas: {len(popular_in_catalog)} en el catálogo y {len(popular_missing)} faltantes de {len(ranked)}.")
+
+async def popular_sync_task():
+    # Un líder nuevo no repite la sincronización si la del anterior sigue vigente
+    if shared_store:
+        shared = await asyncio.to_thread(shared_store.get_setting, "popular_movies")
+        if shared:
+            await asyncio.sleep(max(0, shared["synced_at"] + POPULAR_SYNC_INTERVAL - time.time()))
+    while True:
+        try:
+            await sync_popular_movies()
+        except Exception as e:
+            logging.error(f"Error al sincronizar las películas populares: {e}")
+        await asyncio.sleep(POPULAR_SYNC_INTERVAL)
+
+async def shared_popular_task():
+    """Aplica en cada worker la lista de populares que sincronizó el líder."""
+    synced_at = None
+    while True:
+        try:
+            shared = await asyncio.to_thread(shared_store.get_setting, "popular_movies")
+            if shared and shared["synced_at"] != synced_at:
+                synced_at = shared["synced_at"]
+                cross_popular_with_catalog(shared["ranked"])
+        except Exception as e:
+            logging.error(f"Error al leer las películas populares compartidas: {e}")
+        await asyncio.sleep(POPULAR_SHARE_INTERVAL)
+
+@dp.message(Command("populares_faltantes"))
+async def popular_missing_command(message: types.Message):
+    if str(message.from_user.id) != ADMIN_ID:
+        await message.reply("No tienes permiso para esta acción.")
+        return
+
+    refresh_popular_cross()
+    if not popular_missing:
+        await message.reply("No hay películas populares pendientes de agregar (o aún no se sincronizaron).")
+        return
+
+    lines = []
+    for i, result in enumerate(popular_missing[:20], start=1):
+        year = (result.get("release_date") or "")[:4]
+        title = html.escape(result.get("title") or result.get("original_title") or "Título desconocido")
+        lines.append(f"{i}. {title}" + (f" ({year})" if year else "") + f" — ID TMDB <code>{result['id']}</code>")
+    await message.reply("🔥 <b>Populares que faltan en el catálogo</b>\n\n" + "\n".join(lines), parse_mode=ParseMode.HTML)
+
+# Trabajos en segundo plano para operaciones largas de administración
+class Job:
+    __slots__ = ("id", "kind", "chat_id", "message_id", "status", "done", "total", "errors", "failed_titles",
+                 "created_at", "finished_at", "last_edit", "task")
+
+    def __init__(self, job_id, kind, chat_id, status="pendiente", done=0, total=0, errors=0,
+                 failed_titles=None, created_at=None, finished_at=None, message_id=None):
+        self.id = job_id
+        self.kind = kind
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.status = status
+        self.done = done
+        self.total = total
+        self.errors = errors
+        self.failed_titles = failed_titles or []
+        self.created_at = created_at or time.time()
+        self.finished_at = finished_at
+        self.last_edit = 0.0
+        self.task = None
+
+    @property
+    def finished(self):
+        return self.status in ("completado", "cancelado", "error", "interrumpido")
+
+    def to_dict(self):
+        return {
+            "id": self.id, "kind": self.kind, "chat_id": self.chat_id, "message_id": self.message_id,
+            "status": self.status, "done": self.done, "total": self.total, "errors": self.errors,
+            "failed_titles": self.failed_titles, "created_at": self.created_at, "finished_at": self.finished_at,
+        }
+
+class JobRunner:
+    """
+    Ejecuta trabajos largos con un grupo de tareas asyncio. Cada trabajo tiene un
+    ID, se puede cancelar, guarda su estado y muestra su progreso editando un
+    único mensaje como mucho cada JOB_PROGRESS_INTERVAL segundos.
+    """
+    KINDS = {}
+    MAX_SAVED_JOBS = 50
+
+    def __init__(self):
+        self.jobs = {}
+        self.queue = asyncio.Queue()
+        self.workers = []
+        self.start_lock = asyncio.Lock()
+
+    @classmethod
+    def register(cls, kind, label):
+        def decorator(func):
+            cls.KINDS[kind] = (label, func)
+            return func
+        return decorator
+
+    async def load(self):
+        try:
+            if shared_store:
+                saved = await asyncio.to_thread(shared_store.get_setting, "jobs", [])
+            else:
+                with open(JOBS_FILE, "r", encoding="utf-8") as f:
+                    saved = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            saved = []
+        for data in saved:
+            job = Job(data.pop("id"), data.pop("kind"), data.pop("chat_id"), **data)
+            # Los trabajos que no terminaron se perdieron al reiniciar el bot
+            if not job.finished:
+                job.status = "interrumpido"
+                job.finished_at = time.time()
+            self.jobs[job.id] = job
+
+    async def save(self):
+        saved = [job.to_dict() for job in list(self.jobs.values())[-self.MAX_SAVED_JOBS:]]
+        if shared_store:
+            await asyncio.to_thread(shared_store.set_setting, "jobs", saved)
+            return
+        with open(JOBS_FILE, "w", encoding="utf-8") as f:
+            json.dump(saved, f, ensure_ascii=False, indent=4)
+
+    async def ensure_workers(self):
+        async with self.start_lock:
+            if not self.workers:
+                await self.load()
+                self.workers = [asyncio.create_task(self.worker()) for _ in range(JOB_WORKERS)]
+
+    async def submit(self, kind, chat_id):
+        await self.ensure_workers()
+        job = Job(max(self.jobs, default=0) + 1, kind, chat_id)
+        self.jobs[job.id] = job
+        message = await bot.send_message(chat_id, self.status_text(job), reply_markup=self.status_keyboard(job))
+        job.message_id = message.message_id
+        await self.save()
+        await self.queue.put(job)
+        return job
+
+    async def cancel(self, job_id):
+        job = self.jobs.get(job_id)
+        if not job or job.finished:
+            return False
+        if job.task:
+            job.task.cancel()
+        else:
+            job.status = "cancelado"
+            job.finished_at = time.time()
+            await self.update_status(job, force=True)
+        return True
+
+    def status_text(self, job):
+        label = self.KINDS[job.kind][0]
+        text = f"⚙️ <b>Trabajo #{job.id}: {label}</b>\nEstado: {job.status}\nProgreso: {job.done}/{job.total or '?'}"
+        if job.errors:
+            text += f"\nErrores: {job.errors}"
+        if job.finished and job.failed_titles:
+            text += "\n\n" + "\n".join(f"- {html.escape(title)}" for title in job.failed_titles[:10])
+        return text
+
+    def status_keyboard(self, job):
+        if job.finished:
+            return None
+        return types.InlineKeyboardMarkup(inline_keyboard=[
+            [types.InlineKeyboardButton(text="✖️ Cancelar", callback_data=f"cancel_job_{job.id}")]
+        ])
+
+    async def update_status(self, job, force=False):
+        """Edita el mensaje de estado, limitado a una edición cada JOB_PROGRESS_INTERVAL segundos."""
+        now = time.monotonic()
+        if not force and now - job.last_edit < JOB_PROGRESS_INTERVAL:
+            return
+        job.last_edit = now
+        await self.save()
+        try:
+            await bot.edit_message_text(
+                chat_id=job.chat_id,
+                message_id=job.message_id,
+                text=self.status_text(job),
+                reply_markup=self.status_keyboard(job)
+            )
+        except Exception as e:
+            logging.warning(f"No se pudo actualizar el estado del trabajo #{job.id}: {e}")
+
+    async def progress(self, job, failed_title=None):
+        job.done += 1
+        if failed_title:
+            job.errors += 1
+            job.failed_titles.append(failed_title)
+        await self.update_status(job)
+
+    async def worker(self):
+        while True:
+            job = await self.queue.get()
+            if job.status != "pendiente":
+                continue
+            job.status = "en curso"
+            await self.update_status(job, force=True)
+            job.task = asyncio.create_task(self.KINDS[job.kind][1](job))
+            try:
+                await job.task
+                job.status = "completado"
+            except asyncio.CancelledError:
+                if asyncio.current_task().cancelling():
+                    # Se cancela el propio worker (por ejemplo, al apagar el bot), no solo el trabajo
+                    job.task.cancel()
+                    job.status = "interrumpido"
+                    job.task = None
+                    job.finished_at = time.time()
+                    await self.save()
+                    raise
+                job.status = "cancelado"
+            except Exception as e:
+                logging.error(f"Error en el trabajo #{job.id}: {e}")
+                job.status = "error"
+            job.task = None
+            job.finished_at = time.time()
+            await self.update_status(job, force=True)
+
+job_runner = JobRunner()
+
+@JobRunner.register("republish_all", "Republicar todo el catálogo")
+async def republish_all_job(job):
+    records = [record for record in movies_db.values() if record.link_alive is not False]
+    job.total = len(records)
+    for record in records:
+        movie_data, rendered = await get_post_content(record)
+        sent = 0
+        if movie_data:
+            sent, _ = await publish_movie(movie_data, record.link, rendered)
+        await job_runner.progress(job, None if sent else record.title)
+        # Pausa para no superar los límites de envío de Telegram en el canal
+        await asyncio.sleep(JOB_PUBLISH_SPACING)
+
+@JobRunner.register("refresh_metadata", "Actualizar metadatos de TMDB")
+async def refresh_metadata_job(job):
+    records = list(movies_db.values())
+    job.total = len(records)
+    for record in records:
+        movie_data = await fetch_movie_details_with_retry(record.id, attempts=2)
+        if movie_data:
+            invalidate_rendered_posts(record.id)
+            rendered = render_movie_post(movie_data, record.link)
+            # Los posts ya publicados se corrigen en el sitio, sin moverlos al final del canal
+            channel_ids = [chat_id for chat_id in record.message_ids if chat_id in TELEGRAM_CHANNEL_IDS]
+            if channel_ids:
+                await publish_movie(movie_data, record.link, rendered, channel_ids, bump=False)
+                # Pausa para no superar los límites de edición de Telegram en el canal
+                await asyncio.sleep(JOB_PUBLISH_SPACING)
+        await job_runner.progress(job, None if movie_data else record.title)
+
+@JobRunner.register("link_audit", "Auditar enlaces")
+async def link_audit_job(job):
+    dead_records = await audit_links(force=True, job=job)
+    await send_link_audit_summary(dead_records, len(movies_db))
+
+@dp.message(Command("republicar_todo", "actualizar_metadatos"))
+@catalog_writer
+async def start_job_command(message: types.Message, command: CommandObject):
+    if str(message.from_user.id) != ADMIN_ID:
+        await message.reply("No tienes permiso para esta acción.")
+        return
+
+    kind = "republish_all" if command.command == "republicar_todo" else "refresh_metadata"
+    await job_runner.submit(kind, message.chat.id)
+
+@dp.message(Command("trabajos"))
+async def list_jobs_command(message: types.Message):
+    if str(message.from_user.id) != ADMIN_ID:
+        await message.reply("No tienes permiso para esta acción.")
+        return
+
+    await job_runner.ensure_workers()
+    jobs = list(job_runner.jobs.values())[-10:]
+    if not jobs:
+        await message.reply("No hay trabajos registrados.")
+        return
+    lines = [f"#{job.id} {JobRunner.KINDS[job.kind][0]}: {job.status} ({job.done}/{job.total or '?'})" for job in jobs]
+    await message.reply("⚙️ Últimos trabajos:\n\n" + "\n".join(lines))
+
+@dp.callback_query(F.data.startswith("cancel_job_"))
+@catalog_writer
+async def cancel_job_callback(callback_query: types.CallbackQuery):
+    if str(callback_query.from_user.id) != ADMIN_ID:
+        await bot.answer_callback_query(callback_query.id, "No tienes permiso para esta acción.")
+        return
+
+    job_id = int(callback_query.data.split("_")[-1])
+    if await job_runner.cancel(job_id):
+        await bot.answer_callback_query(callback_query.id, f"Cancelando el trabajo #{job_id}...")
+    else:
+        await bot.answer_callback_query(callback_query.id, "El trabajo ya terminó.", show_alert=True)
+
 # Funciones de publicación automática
+async def enqueue_scheduled_post(record, delay_minutes):
+    if shared_store:
+        # En modo multiproceso la cola vive en la base compartida y la atiende el líder
+        await asyncio.to_thread(shared_store.add_scheduled_post, record.id, time.time() + delay_minutes * 60)
+        return
+    await scheduled_posts.put((record, delay_minutes))
+    scheduled_prefetch_ids.add(record.id)
+
+async def sync_shared_auto_post_state():
+    """Trae de la base compartida la configuración y las publicaciones programadas que ya vencieron."""
+    global AUTO_POST_COUNT
+    AUTO_POST_COUNT = await asyncio.to_thread(shared_store.get_setting, "auto_post_count", AUTO_POST_COUNT)
+    last_auto_post_time = await asyncio.to_thread(shared_store.get_setting, "last_auto_post_time")
+    if last_auto_post_time:
+        admin_data["last_auto_post_time"] = datetime.datetime.fromtimestamp(last_auto_post_time)
+    for movie_id in await asyncio.to_thread(shared_store.take_due_scheduled_posts):
+        record = get_movie_by_id(movie_id)
+        if record:
+            await scheduled_posts.put((record, 0))
+
 async def auto_post_task():
     """
     Tarea asincrónica que publica películas automáticamente en el canal.
     """
     while True:
         try:
+            if shared_store:
+                await sync_shared_auto_post_state()
+
             # 1. Publicar desde la cola de posts programados
             if not scheduled_posts.empty():
                 logging.info("Procesando posts programados...")
                 movie_info, delay_minutes = await scheduled_posts.get()
                 await asyncio.sleep(delay_minutes * 60)
-                movie_data = get_movie_details(movie_info.get("id"))
+                movie_data, rendered = await get_post_content(movie_info)
                 if movie_data:
-                    await delete_old_post(movie_info.get("id"))
-                    await send_movie_post(TELEGRAM_CHANNEL_ID, movie_data, movie_info.get("link"))
+                    await publish_movie(movie_data, movie_info.link, rendered)
                 else:
-                    logging.error(f"No se pudo obtener la información de la película programada con ID {movie_info.get('id')}.")
+                    logging.error(f"No se pudo obtener la información de la película programada con ID {movie_info.id}.")
+                scheduled_prefetch_ids.discard(movie_info.id)
                 scheduled_posts.task_done()
                 continue  # Volver al inicio del bucle para revisar si hay más posts programados
 
@@ -865,20 +2500,21 @@ async def auto_post_task():
 
             if last_auto_post_time is None or (now - last_auto_post_time).total_seconds() >= interval_hours * 3600:
                 logging.info("Hora de una nueva publicación automática.")
-                available_movies = [m for m in movies_db.values() if m.get("id") not in [p.get("id") for p in recent_posts]]
-                
-                if available_movies:
-                    chosen_movie = random.choice(available_movies)
-                    movie_data = get_movie_details(chosen_movie.get("id"))
+                refill_auto_post_candidates()
+
+                if auto_post_candidates:
+                    chosen_movie = auto_post_candidates.popleft()
+                    movie_data, rendered = await get_post_content(chosen_movie)
                     if movie_data:
-                        await delete_old_post(chosen_movie.get("id"))
-                        success, _ = await send_movie_post(TELEGRAM_CHANNEL_ID, movie_data, chosen_movie.get("link"))
-                        if success:
+                        sent, _ = await publish_movie(movie_data, chosen_movie.link, rendered)
+                        if sent:
                             admin_data["last_auto_post_time"] = now
+                            if shared_store:
+                                await asyncio.to_thread(shared_store.set_setting, "last_auto_post_time", now.timestamp())
                             recent_posts.append(chosen_movie)
-                            logging.info(f"Publicación automática de '{chosen_movie.get('names')[0]}' completada.")
+                            logging.info(f"Publicación automática de '{chosen_movie.title}' completada.")
                     else:
-                        logging.error(f"No se pudo obtener la información de la película aleatoria con ID {chosen_movie.get('id')}.")
+                        logging.error(f"No se pudo obtener la información de la película aleatoria con ID {chosen_movie.id}.")
                 else:
                     logging.warning("No hay películas disponibles para publicación automática.")
 
@@ -888,14 +2524,220 @@ async def auto_post_task():
         # Esperar un minuto antes de la siguiente revisión
         await asyncio.sleep(60)
 
+def start_background_tasks():
+    # Iniciar la tarea de publicación automática, la precarga de sus publicaciones,
+    # la auditoría de enlaces y la sincronización de populares
+    return [
+        asyncio.create_task(auto_post_task()),
+        asyncio.create_task(prefetch_task()),
+        asyncio.create_task(link_audit_task()),
+        asyncio.create_task(popular_sync_task()),
+    ]
+
 async def main():
     load_movies_db()
-    # Iniciar la tarea de publicación automática
-    asyncio.create_task(auto_post_task())
+    # Los índices secundarios se construyen mientras el bot ya recibe actualizaciones
+    asyncio.create_task(build_catalog_indexes())
+    if catalog_follower:
+        # Instancia espejo: solo responde consultas, las publicaciones las hace la principal
+        asyncio.create_task(catalog_follow_task())
+    else:
+        start_background_tasks()
     try:
         await dp.start_polling(bot)
     finally:
         await bot.session.close()
 
+# Modo multiproceso: un proceso lee las actualizaciones y las reparte por chat entre los workers
+def update_chat_id(update):
+    try:
+        event = update.event
+    except Exception:
+        return 0
+    chat = getattr(event, "chat", None) or getattr(getattr(event, "message", None), "chat", None)
+    if chat:
+        return chat.id
+    user = getattr(event, "from_user", None)
+    return user.id if user else 0
+
+def start_worker(context, index, queue):
+    worker = context.Process(target=worker_process, args=(index, queue), daemon=True)
+    worker.start()
+    return worker
+
+async def watch_workers(context, workers, queues):
+    """
+    Vuelve a lanzar los workers que terminan inesperadamente, con la misma cola
+    para que atiendan las actualizaciones pendientes de sus chats. Si se caen
+    demasiadas veces seguidas, detiene el bot en lugar de reiniciarlos sin fin.
+    """
+    restarts = deque()
+    while True:
+        await asyncio.sleep(WORKER_CHECK_INTERVAL)
+        for index, worker in enumerate(workers):
+            if worker.is_alive():
+                continue
+            now = time.time()
+            restarts.append(now)
+            while now - restarts[0] > 60:
+                restarts.popleft()
+            if len(restarts) > WORKER_MAX_RESTARTS:
+                raise RuntimeError(f"El worker {index} terminó con código {worker.exitcode} y los workers se reiniciaron demasiadas veces.")
+            logging.error(f"El worker {index} terminó con código {worker.exitcode}; se vuelve a lanzar.")
+            workers[index] = start_worker(context, index, queues[index])
+
+async def dispatch_updates(queues, workers, context):
+    offset = None
+    watcher = asyncio.create_task(watch_workers(context, workers, queues))
+    try:
+        while True:
+            if watcher.done():
+                # Propaga el error si los workers no se pudieron mantener en marcha
+                watcher.result()
+            try:
+                updates = await bot.get_updates(offset=offset, timeout=30)
+            except Exception as e:
+                logging.error(f"Error al obtener actualizaciones: {e}")
+                await asyncio.sleep(5)
+                continue
+            for update in updates:
+                offset = update.update_id + 1
+                chat_id = update_chat_id(update)
+                raw_update = update.model_dump(mode="json", by_alias=True, exclude_none=True)
+                queues[chat_id % len(queues)].put((chat_id, raw_update))
+    finally:
+        watcher.cancel()
+        await bot.session.close()
+
+async def catalog_sync_task():
+    """Aplica los cambios del catálogo hechos por los demás workers."""
+    while True:
+        try:
+            # En la misma cola que las escrituras, para leer después de los cambios propios pendientes
+            changes = await asyncio.get_running_loop().run_in_executor(shared_writes, shared_store.fetch_changes)
+            for key, data in changes:
+                apply_catalog_change(key, data)
+        except Exception as e:
+            logging.error(f"Error al sincronizar el catálogo: {e}")
+        await asyncio.sleep(CATALOG_SYNC_INTERVAL)
+
+def sync_demand(exported):
+    """Publica los conteos de este worker y suma los de los demás. Se ejecuta en un hilo."""
+    for tracker, windows in exported:
+        for window, start, sketch, top in windows:
+            shared_store.save_demand(tracker.name, window, start, sketch, top)
+            tracker.set_remote(window, start, shared_store.load_demand(tracker.name, window, start))
+
+async def demand_sync_task():
+    while True:
+        await asyncio.sleep(DEMAND_SYNC_INTERVAL)
+        try:
+            # Las ventanas locales se serializan en el bucle, donde se actualizan
+            exported = [(tracker, tracker.export()) for tracker in (demand_hits, demand_missing)]
+            await asyncio.to_thread(sync_demand, exported)
+        except Exception as e:
+            logging.error(f"Error al sincronizar la analítica de demanda: {e}")
+
+async def leader_task():
+    """
+    Solo el worker que tiene el arrendamiento ejecuta las publicaciones automáticas,
+    las programadas, las auditorías, la sincronización de populares y la limpieza de cambios
+    ya sincronizados. Si lo pierde, las detiene.
+    """
+    tasks = []
+    while True:
+        try:
+            is_leader = await asyncio.to_thread(shared_store.acquire_lease, "scheduler", LEADER_LEASE_TTL)
+        except Exception as e:
+            logging.error(f"Error al renovar el arrendamiento del líder: {e}")
+            is_leader = False
+
+        if is_leader and not tasks:
+            logging.info(f"El worker {WORKER_ID} es ahora el líder.")
+            tasks = start_background_tasks()
+        elif not is_leader and tasks:
+            logging.warning(f"El worker {WORKER_ID} dejó de ser el líder.")
+            for task in tasks:
+                task.cancel()
+            tasks = []
+
+        if is_leader:
+            try:
+                pruned = await asyncio.to_thread(shared_store.prune_changes, CATALOG_CHANGES_MAX_AGE)
+                if pruned:
+                    logging.info(f"Se borraron {pruned} cambios del catálogo ya sincronizados.")
+            except Exception as e:
+                logging.error(f"Error al limpiar el registro de cambios del catálogo: {e}")
+        await asyncio.sleep(LEADER_LEASE_TTL / 3)
+
+async def worker_main(queue):
+    global shared_store
+    shared_store = SharedStore(SHARED_DB_FILE, WORKER_ID)
+    dp.fsm.storage = SQLiteStorage(shared_store)
+    load_movies_db()
+    asyncio.create_task(build_catalog_indexes())
+    asyncio.create_task(catalog_sync_task())
+    asyncio.create_task(demand_sync_task())
+    asyncio.create_task(shared_popular_task())
+    asyncio.create_task(leader_task())
+
+    # Las actualizaciones de un mismo chat se procesan en orden
+    chat_locks = {}
+    chat_pending = {}
+
+    async def process_update(chat_id, raw_update):
+        lock = chat_locks.setdefault(chat_id, asyncio.Lock())
+        chat_pending[chat_id] = chat_pending.get(chat_id, 0) + 1
+        try:
+            async with lock:
+                await dp.feed_raw_update(bot, raw_update)
+        finally:
+            chat_pending[chat_id] -= 1
+            if not chat_pending[chat_id]:
+                del chat_pending[chat_id]
+                del chat_locks[chat_id]
+
+    try:
+        while True:
+            item = await asyncio.to_thread(queue.get)
+            if item is None:
+                break
+            asyncio.create_task(process_update(*item))
+    finally:
+        await bot.session.close()
+
+def worker_process(index, queue):
+    global WORKER_ID
+    WORKER_ID = f"worker-{index}"
+    asyncio.run(worker_main(queue))
+
+def run_sharded():
+    # El catálogo inicial se importa a la base compartida antes de arrancar los workers
+    store = SharedStore(SHARED_DB_FILE, "dispatcher")
+    try:
+        with open(MOVIES_DB_FILE, "r", encoding="utf-8") as f:
+            imported = store.seed_catalog([
+                (key, MovieRecord.from_dict(key, data).to_dict()) for key, data in iter_catalog_items(f)
+            ])
+        if imported:
+            logging.info(f"Se importaron {imported} películas a la base compartida.")
+    except (FileNotFoundError, json.JSONDecodeError):
+        logging.warning("No se encontró el archivo de la base de datos; la base compartida empieza vacía.")
+    store.close()
+
+    context = multiprocessing.get_context("spawn")
+    queues = [context.Queue() for _ in range(WORKER_COUNT)]
+    workers = [start_worker(context, i, queue) for i, queue in enumerate(queues)]
+    try:
+        asyncio.run(dispatch_updates(queues, workers, context))
+    finally:
+        for queue in queues:
+            queue.put(None)
+        for worker in workers:
+            worker.join(timeout=10)
+
 if __name__ == "__main__":
-    asyncio.run(main())
+    if WORKER_COUNT > 1:
+        run_sharded()
+    else:
+        asyncio.run(main())
@@ -0,0 +1,226 @@
+"""
+Registro de cambios del catálogo (solo se agregan líneas JSON) con compactación
+en instantáneas, historial para recuperar el catálogo en un momento dado y
+lectura continua para instancias espejo de solo lectura.
+
+Cada entrada es un cambio absoluto (insertar, cambiar enlace, fijar mensaje,
+eliminar...), así que volver a aplicar entradas ya incluidas en una instantánea
+no altera el resultado.
+"""
+import json
+import logging
+import os
+import re
+import shutil
+import time
+
+SNAPSHOT_RE = re.compile(r"^snapshot-(\d+)-(\d+)\.json$")
+SEGMENT_RE = re.compile(r"^segment-(\d+)\.jsonl$")
+
+
+def iter_journal_file(path):
+    """Lee las entradas de un archivo de registro, ignorando una última línea incompleta."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    logging.warning(f"Entrada incompleta ignorada en {path}.")
+    except FileNotFoundError:
+        return
+
+
+def list_archived(archive_dir, pattern):
+    """Archivos archivados que cumplen el patrón, ordenados por secuencia."""
+    if not archive_dir or not os.path.isdir(archive_dir):
+        return []
+    matches = [(pattern.match(name), name) for name in os.listdir(archive_dir)]
+    return sorted(
+        ((int(match.group(1)), match, os.path.join(archive_dir, name)) for match, name in matches if match),
+        key=lambda item: item[0]
+    )
+
+
+class JournalGap(Exception):
+    """Faltan entradas del registro seguido y ya no están en los segmentos archivados."""
+
+
+class CatalogJournal:
+    def __init__(self, path, snapshot_path, archive_dir, archive_keep=20, fsync=False):
+        self.path = path
+        self.snapshot_path = snapshot_path
+        self.archive_dir = archive_dir
+        self.archive_keep = archive_keep
+        self.fsync = fsync
+        self.seq = 0
+        self.pending = 0
+        self.file = None
+
+    def archived(self, pattern):
+        return list_archived(self.archive_dir, pattern)
+
+    def open(self):
+        """
+        Abre el registro para agregar entradas y devuelve las que hay que aplicar
+        sobre la instantánea actual.
+        """
+        os.makedirs(self.archive_dir, exist_ok=True)
+        entries = list(iter_journal_file(self.path))
+        archived_seqs = [seq for seq, _, _ in self.archived(SNAPSHOT_RE) + self.archived(SEGMENT_RE)]
+        self.seq = max([entry["seq"] for entry in entries] + archived_seqs + [0])
+        self.pending = len(entries)
+        # Instantánea base para poder recuperar estados anteriores a la primera compactación
+        if not self.archived(SNAPSHOT_RE):
+            self.archive_snapshot(self.seq - len(entries))
+        self.file = open(self.path, "a", encoding="utf-8")
+        return entries
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+
+    def append(self, op, key, **fields):
+        """Agrega un cambio al registro: una sola escritura al final del archivo."""
+        self.seq += 1
+        entry = {"seq": self.seq, "ts": time.time(), "op": op, "key": key, **fields}
+        self.file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self.file.flush()
+        if self.fsync:
+            os.fsync(self.file.fileno())
+        self.pending += 1
+        return entry
+
+    def archive_snapshot(self, seq):
+        target = os.path.join(self.archive_dir, f"snapshot-{seq}-{int(time.time())}.json")
+        if os.path.exists(self.snapshot_path):
+            shutil.copyfile(self.snapshot_path, target)
+        else:
+            with open(target, "w", encoding="utf-8") as f:
+                f.write("{}")
+
+    def compact(self, write_snapshot):
+        """
+        Escribe una instantánea con write_snapshot() y archiva el registro actual
+        junto con una copia de la instantánea. Los lectores que siguen el registro
+        terminan de leer el archivo anterior antes de pasar al nuevo.
+        """
+        write_snapshot()
+        self.close()
+        if os.path.exists(self.path):
+            os.replace(self.path, os.path.join(self.archive_dir, f"segment-{self.seq}.jsonl"))
+        self.archive_snapshot(self.seq)
+        self.pending = 0
+        self.file = open(self.path, "a", encoding="utf-8")
+        self.prune()
+
+    def prune(self):
+        snapshots = self.archived(SNAPSHOT_RE)
+        if len(snapshots) <= self.archive_keep:
+            return
+        for _, _, path in snapshots[:-self.archive_keep]:
+            os.remove(path)
+        oldest_seq = snapshots[-self.archive_keep][0]
+        for seq, _, path in self.archived(SEGMENT_RE):
+            if seq <= oldest_seq:
+                os.remove(path)
+
+    def history_until(self, until_ts):
+        """
+        Devuelve la ruta de la instantánea base más reciente anterior a until_ts
+        y las entradas posteriores a ella hasta ese momento, o (None, []) si el
+        historial no llega tan atrás.
+        """
+        bases = [(seq, path) for seq, match, path in self.archived(SNAPSHOT_RE) if int(match.group(2)) <= until_ts]
+        if not bases:
+            return None, []
+        base_seq, base_path = bases[-1]
+        paths = [path for seq, _, path in self.archived(SEGMENT_RE) if seq > base_seq] + [self.path]
+        entries = [
+            entry for path in paths for entry in iter_journal_file(path)
+            if base_seq < entry["seq"] and entry["ts"] <= until_ts
+        ]
+        return base_path, entries
+
+
+class JournalFollower:
+    """
+    Sigue el registro de otra instancia. Si la instancia compacta y reemplaza el
+    archivo, termina de leer el anterior y continúa con el nuevo desde el inicio;
+    las entradas de los archivos que se compactaron entre dos lecturas se
+    recuperan de los segmentos archivados.
+    """
+
+    def __init__(self, path, archive_dir=None, last_seq=0):
+        self.path = path
+        self.archive_dir = archive_dir
+        self.last_seq = last_seq
+        self.file = None
+        self.buffer = ""
+
+    def open(self):
+        try:
+            self.file = open(self.path, "r", encoding="utf-8")
+        except FileNotFoundError:
+            self.file = None
+        self.buffer = ""
+
+    def read_available(self):
+        if not self.file:
+            return []
+        self.buffer += self.file.read()
+        *lines, self.buffer = self.buffer.split("\n")
+        return [json.loads(line) for line in lines if line.strip()]
+
+    def archived_after(self, seq):
+        """Entradas posteriores a seq guardadas en los segmentos archivados."""
+        return [
+            entry
+            for segment_seq, _, path in list_archived(self.archive_dir, SEGMENT_RE) if segment_seq > seq
+            for entry in iter_journal_file(path) if entry["seq"] > seq
+        ]
+
+    def resync(self):
+        """
+        Vuelve a empezar desde la instantánea archivada más reciente. Devuelve su
+        ruta y las entradas posteriores a ella que hay que aplicar encima.
+        """
+        if self.file:
+            self.file.close()
+        # Se abre el registro antes de elegir la instantánea para no perder cambios si se compacta entretanto
+        self.open()
+        snapshots = list_archived(self.archive_dir, SNAPSHOT_RE)
+        if not snapshots:
+            raise JournalGap(f"no hay instantáneas archivadas en {self.archive_dir}")
+        self.last_seq, _, snapshot_path = snapshots[-1]
+        return snapshot_path, self.poll()
+
+    def poll(self):
+        if not self.file:
+            self.open()
+        entries = self.read_available()
+        try:
+            rotated = not self.file or os.stat(self.path).st_ino != os.fstat(self.file.fileno()).st_ino
+        except FileNotFoundError:
+            rotated = False
+        if rotated:
+            entries += self.read_available()
+            if self.file:
+                self.file.close()
+            # La instancia pudo compactar más de una vez desde la última lectura
+            entries += self.archived_after(self.last_seq)
+            self.open()
+            entries += self.read_available()
+
+        new_entries = []
+        for entry in sorted(entries, key=lambda entry: entry["seq"]):
+            if entry["seq"] <= self.last_seq:
+                continue
+            if entry["seq"] != self.last_seq + 1:
+                raise JournalGap(f"faltan las entradas {self.last_seq + 1} a {entry['seq'] - 1}")
+            new_entries.append(entry)
+            self.last_seq = entry["seq"]
+        return new_entries
@@ -0,0 +1,325 @@
+"""
+Almacenamiento compartido en SQLite (modo WAL) para ejecutar el bot con varios
+procesos: catálogo con registro de cambios, estados de aiogram, publicaciones
+programadas, ajustes, analítica de demanda y el arrendamiento (lease) del proceso líder.
+"""
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder
+
+# Cada cuánto renueva un worker sin cambios pendientes su cursor del registro de cambios
+CURSOR_REFRESH_INTERVAL = 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS catalog (
+    key TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS catalog_changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    key TEXT NOT NULL,
+    worker TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS change_cursors (
+    worker TEXT PRIMARY KEY,
+    seq INTEGER NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS fsm (
+    key TEXT PRIMARY KEY,
+    state TEXT,
+    data TEXT NOT NULL DEFAULT '{}'
+);
+CREATE TABLE IF NOT EXISTS scheduled_posts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    movie_id INTEGER NOT NULL,
+    fire_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS settings (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS demand (
+    worker TEXT NOT NULL,
+    tracker TEXT NOT NULL,
+    name TEXT NOT NULL,
+    start REAL NOT NULL,
+    sketch BLOB NOT NULL,
+    top TEXT NOT NULL,
+    PRIMARY KEY (worker, tracker, name)
+);
+CREATE TABLE IF NOT EXISTS leases (
+    name TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+"""
+
+
+class SharedStore:
+    """
+    Conexión a la base compartida. Los métodos son síncronos y breves; desde
+    código asíncrono se llaman con asyncio.to_thread.
+    """
+
+    def __init__(self, path, worker_id):
+        self.worker_id = worker_id
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.last_change_seq = 0
+        self.cursor_saved_at = 0
+
+    def query(self, sql, params=()):
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def transaction(self, func):
+        """Ejecuta func(conn) dentro de una transacción de escritura."""
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = func(self.conn)
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+            return result
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    # Catálogo
+    def seed_catalog(self, items):
+        """Importa el catálogo inicial si la base todavía está vacía."""
+        def seed(conn):
+            if conn.execute("SELECT 1 FROM catalog LIMIT 1").fetchone():
+                return 0
+            rows = [(key, json.dumps(data, ensure_ascii=False)) for key, data in items]
+            conn.executemany("INSERT INTO catalog (key, data) VALUES (?, ?)", rows)
+            return len(rows)
+        return self.transaction(seed)
+
+    def load_catalog(self):
+        with self.lock:
+            self.last_change_seq = self.conn.execute("SELECT COALESCE(MAX(seq), 0) FROM catalog_changes").fetchone()[0]
+            rows = self.conn.execute("SELECT key, data FROM catalog").fetchall()
+            self.save_cursor()
+        return [(key, json.loads(data)) for key, data in rows]
+
+    def put_entry(self, key, data):
+        """Guarda una entrada del catálogo y registra el cambio para los demás procesos."""
+        serialized = json.dumps(data, ensure_ascii=False)
+
+        def put(conn):
+            conn.execute(
+                "INSERT INTO catalog (key, data) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET data = excluded.data",
+                (key, serialized)
+            )
+            conn.execute("INSERT INTO catalog_changes (key, worker) VALUES (?, ?)", (key, self.worker_id))
+        self.transaction(put)
+
+    def delete_entry(self, key):
+        def delete(conn):
+            conn.execute("DELETE FROM catalog WHERE key = ?", (key,))
+            conn.execute("INSERT INTO catalog_changes (key, worker) VALUES (?, ?)", (key, self.worker_id))
+        self.transaction(delete)
+
+    def apply_change(self, op, key, fields):
+        """
+        Guarda un cambio del catálogo tocando solo el campo afectado, para que dos
+        workers que cambian campos distintos de una misma entrada no se pisen.
+        """
+        if op == "insert":
+            self.put_entry(key, fields["data"])
+            return
+        if op == "delete":
+            self.delete_entry(key)
+            return
+
+        if op == "update_link":
+            sql = "json_set(data, '$.link', ?, '$.link_alive', json('null'), '$.link_checked_at', json('null'))"
+            params = (fields["link"],)
+        elif op == "set_message_id":
+            path = f'$.message_ids."{fields["chat_id"]}"'
+            hash_path = f'$.post_hashes."{fields["chat_id"]}"'
+            if fields["message_id"] is None:
+                sql, params = "json_remove(data, ?, ?)", (path, hash_path)
+            elif fields.get("post_hash"):
+                sql, params = "json_set(data, ?, ?, ?, ?)", (path, fields["message_id"], hash_path, fields["post_hash"])
+            else:
+                sql, params = "json_remove(json_set(data, ?, ?), ?)", (path, fields["message_id"], hash_path)
+        elif op == "set_post_hash":
+            sql, params = "json_set(data, ?, ?)", (f'$.post_hashes."{fields["chat_id"]}"', fields["post_hash"])
+        elif op == "set_link_alive":
+            sql = "json_set(data, '$.link_alive', json(?), '$.link_checked_at', ?)"
+            params = (json.dumps(fields["alive"]), fields.get("checked_at"))
+        else:
+            raise ValueError(f"Cambio de catálogo desconocido: {op}")
+
+        def update(conn):
+            if conn.execute(f"UPDATE catalog SET data = {sql} WHERE key = ?", (*params, key)).rowcount:
+                conn.execute("INSERT INTO catalog_changes (key, worker) VALUES (?, ?)", (key, self.worker_id))
+        self.transaction(update)
+
+    def fetch_changes(self):
+        """
+        Devuelve los cambios hechos por otros procesos desde la última consulta
+        como pares (clave, datos), con datos None si la entrada se eliminó.
+        """
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT seq, key, worker FROM catalog_changes WHERE seq > ? ORDER BY seq",
+                (self.last_change_seq,)
+            ).fetchall()
+            if not rows:
+                # Aunque no haya cambios, el cursor se renueva para seguir contando como activo
+                if time.time() - self.cursor_saved_at >= CURSOR_REFRESH_INTERVAL:
+                    self.save_cursor()
+                return []
+            self.last_change_seq = rows[-1][0]
+            self.save_cursor()
+            keys = list(dict.fromkeys(key for _, key, worker in rows if worker != self.worker_id))
+            changes = []
+            for key in keys:
+                row = self.conn.execute("SELECT data FROM catalog WHERE key = ?", (key,)).fetchone()
+                changes.append((key, row[0] if row else None))
+        return [(key, json.loads(data) if data is not None else None) for key, data in changes]
+
+    def save_cursor(self):
+        """Guarda hasta qué cambio leyó este proceso. Se llama con self.lock tomado."""
+        self.cursor_saved_at = time.time()
+        self.conn.execute(
+            "INSERT INTO change_cursors (worker, seq, updated_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(worker) DO UPDATE SET seq = excluded.seq, updated_at = excluded.updated_at",
+            (self.worker_id, self.last_change_seq, self.cursor_saved_at)
+        )
+
+    def prune_changes(self, max_age):
+        """
+        Borra los cambios que ya leyeron todos los workers activos (los que
+        consultaron en los últimos max_age segundos). Devuelve cuántos se borraron.
+        """
+        def prune(conn):
+            row = conn.execute(
+                "SELECT MIN(seq) FROM change_cursors WHERE updated_at >= ?", (time.time() - max_age,)
+            ).fetchone()
+            if row[0] is None:
+                return 0
+            return conn.execute("DELETE FROM catalog_changes WHERE seq <= ?", (row[0],)).rowcount
+        return self.transaction(prune)
+
+    # Publicaciones programadas
+    def add_scheduled_post(self, movie_id, fire_at):
+        self.transaction(lambda conn: conn.execute(
+            "INSERT INTO scheduled_posts (movie_id, fire_at) VALUES (?, ?)", (movie_id, fire_at)
+        ))
+
+    def scheduled_movie_ids(self):
+        return {row[0] for row in self.query("SELECT DISTINCT movie_id FROM scheduled_posts")}
+
+    def take_due_scheduled_posts(self, now=None):
+        now = time.time() if now is None else now
+
+        def take(conn):
+            rows = conn.execute(
+                "SELECT id, movie_id FROM scheduled_posts WHERE fire_at <= ? ORDER BY fire_at", (now,)
+            ).fetchall()
+            conn.executemany("DELETE FROM scheduled_posts WHERE id = ?", [(row[0],) for row in rows])
+            return [row[1] for row in rows]
+        return self.transaction(take)
+
+    # Ajustes compartidos
+    def get_setting(self, name, default=None):
+        row = self.query("SELECT value FROM settings WHERE name = ?", (name,))
+        return json.loads(row[0][0]) if row else default
+
+    def set_setting(self, name, value):
+        self.transaction(lambda conn: conn.execute(
+            "INSERT INTO settings (name, value) VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET value = excluded.value",
+            (name, json.dumps(value))
+        ))
+
+    # Analítica de demanda: cada worker publica sus ventanas y lee las de los demás
+    def save_demand(self, tracker, name, start, sketch, top):
+        self.transaction(lambda conn: conn.execute(
+            "INSERT INTO demand (worker, tracker, name, start, sketch, top) VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(worker, tracker, name) DO UPDATE SET start = excluded.start, "
+            "sketch = excluded.sketch, top = excluded.top",
+            (self.worker_id, tracker, name, start, sketch, json.dumps(top, ensure_ascii=False))
+        ))
+
+    def load_demand(self, tracker, name, start):
+        rows = self.query(
+            "SELECT sketch, top FROM demand WHERE tracker = ? AND name = ? AND start = ? AND worker != ?",
+            (tracker, name, start, self.worker_id)
+        )
+        return [(sketch, json.loads(top)) for sketch, top in rows]
+
+    # Arrendamiento del líder
+    def acquire_lease(self, name, ttl):
+        """
+        Obtiene o renueva el arrendamiento `name` durante `ttl` segundos.
+        Devuelve True si este proceso es el dueño.
+        """
+        now = time.time()
+
+        def acquire(conn):
+            conn.execute(
+                "INSERT INTO leases (name, owner, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+                "WHERE leases.owner = excluded.owner OR leases.expires_at < ?",
+                (name, self.worker_id, now + ttl, now)
+            )
+            return conn.execute("SELECT owner FROM leases WHERE name = ?", (name,)).fetchone()[0]
+        return self.transaction(acquire) == self.worker_id
+
+    # Estados de aiogram
+    def get_fsm(self, key):
+        row = self.query("SELECT state, data FROM fsm WHERE key = ?", (key,))
+        return (row[0][0], json.loads(row[0][1])) if row else (None, {})
+
+    def set_fsm_state(self, key, state):
+        self.transaction(lambda conn: conn.execute(
+            "INSERT INTO fsm (key, state) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET state = excluded.state",
+            (key, state)
+        ))
+
+    def set_fsm_data(self, key, data):
+        self.transaction(lambda conn: conn.execute(
+            "INSERT INTO fsm (key, data) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET data = excluded.data",
+            (key, json.dumps(data, ensure_ascii=False))
+        ))
+
+
+class SQLiteStorage(BaseStorage):
+    """Almacenamiento de estados de aiogram compartido entre procesos."""
+
+    def __init__(self, store):
+        self.store = store
+        self.key_builder = DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+
+    async def set_state(self, key, state=None):
+        state = state.state if hasattr(state, "state") else state
+        await asyncio.to_thread(self.store.set_fsm_state, self.key_builder.build(key), state)
+
+    async def get_state(self, key):
+        state, _ = await asyncio.to_thread(self.store.get_fsm, self.key_builder.build(key))
+        return state
+
+    async def set_data(self, key, data):
+        await asyncio.to_thread(self.store.set_fsm_data, self.key_builder.build(key), data)
+
+    async def get_data(self, key):
+        _, data = await asyncio.to_thread(self.store.get_fsm, self.key_builder.build(key))
+        return data
+
+    async def close(self):
+        pass
@@ -0,0 +1,121 @@
+import asyncio
+import time
+
+import pytest
+from aiogram import Bot, types
+
+import bot
+
+
+@pytest.fixture
+def catalog(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(bot, "catalog_journal", None)
+    monkeypatch.setattr(bot, "catalog_follower", None)
+    monkeypatch.setattr(bot, "shared_store", None)
+    bot.load_movies_db()
+    asyncio.run(bot.build_catalog_indexes())
+    yield
+    bot.catalog_journal.close()
+
+
+def test_changes_are_replayed_over_the_snapshot(catalog):
+    record = bot.upsert_movie("Matrix", ["Matrix"], 603, "https://a")
+    bot.update_movie_link(record, "https://b")
+    record.message_ids[-100] = 7
+    bot.log_change("set_message_id", record.key, chat_id=-100, message_id=7, post_hash="a:b")
+    bot.log_change("set_post_hash", record.key, chat_id=-100, post_hash="c:b")
+    bot.delete_movie(bot.upsert_movie("Up", ["Up"], 14160, "https://u"))
+
+    bot.load_movies_db()
+    assert list(bot.movies_db) == ["matrix"]
+    reloaded = bot.movies_db["matrix"]
+    assert (reloaded.link, reloaded.message_ids, reloaded.post_hashes) == ("https://b", {-100: 7}, {-100: "c:b"})
+
+
+def test_compaction_keeps_the_catalog_and_follower_sees_every_change(catalog, monkeypatch):
+    monkeypatch.setattr(bot, "JOURNAL_COMPACT_EVERY", 3)
+    follower = bot.JournalFollower(bot.JOURNAL_FILE)
+    follower.open()
+
+    for i in range(5):
+        bot.upsert_movie(f"Película {i}", [f"Película {i}"], i + 1, f"https://{i}")
+    assert bot.catalog_journal.pending == 2
+
+    assert [entry["key"] for entry in follower.poll()] == [f"película {i}" for i in range(5)]
+    bot.load_movies_db()
+    assert sorted(bot.movies_db) == [f"película {i}" for i in range(5)]
+
+
+def test_follower_recovers_entries_from_several_compactions(catalog, monkeypatch):
+    monkeypatch.setattr(bot, "JOURNAL_COMPACT_EVERY", 3)
+    follower = bot.JournalFollower(bot.JOURNAL_FILE, bot.JOURNAL_ARCHIVE_DIR)
+    follower.open()
+
+    # Dos compactaciones entre una lectura y la siguiente
+    for i in range(8):
+        bot.upsert_movie(f"Película {i}", [f"Película {i}"], i + 1, f"https://{i}")
+    assert [entry["seq"] for entry in follower.poll()] == list(range(1, 9))
+    assert follower.poll() == []
+
+
+def test_follower_resyncs_when_archived_segments_were_pruned(catalog, monkeypatch, tmp_path):
+    monkeypatch.setattr(bot, "JOURNAL_COMPACT_EVERY", 3)
+    follower = bot.JournalFollower(bot.JOURNAL_FILE, bot.JOURNAL_ARCHIVE_DIR)
+    follower.open()
+
+    for i in range(8):
+        bot.upsert_movie(f"Película {i}", [f"Película {i}"], i + 1, f"https://{i}")
+    for path in (tmp_path / bot.JOURNAL_ARCHIVE_DIR).glob("segment-*.jsonl"):
+        path.unlink()
+    with pytest.raises(bot.JournalGap):
+        follower.poll()
+
+    snapshot_path, entries = follower.resync()
+    catalog = bot.read_catalog_snapshot(snapshot_path)
+    for entry in entries:
+        bot.apply_journal_entry(catalog, entry)
+    assert sorted(catalog) == [f"película {i}" for i in range(8)]
+
+
+def test_restore_returns_the_catalog_to_a_point_in_time(catalog, monkeypatch):
+    clock = [time.time() + 60]
+    monkeypatch.setattr(time, "time", lambda: clock[0])
+
+    bot.upsert_movie("Matrix", ["Matrix"], 603, "https://a")
+    clock[0] += 3600
+    bot.update_movie_link(bot.get_movie_by_id(603), "https://roto")
+    bot.upsert_movie("Up", ["Up"], 14160, "https://u")
+    clock[0] += 3600
+
+    changed, removed = bot.restore_catalog(clock[0] - 5400)
+    assert (changed, removed) == (1, 1)
+    assert list(bot.movies_db) == ["matrix"]
+    assert bot.get_movie_by_id(603).link == "https://a"
+
+    # La recuperación queda registrada y sobrevive a un reinicio
+    bot.load_movies_db()
+    assert bot.movies_db["matrix"].link == "https://a"
+
+
+def test_mirror_refuses_catalog_changes(catalog, monkeypatch):
+    sent = []
+
+    async def fake_call(self, method, request_timeout=None):
+        sent.append(method)
+
+    monkeypatch.setattr(Bot, "__call__", fake_call)
+    monkeypatch.setattr(bot, "catalog_follower", object())
+    bot.upsert_movie("Matrix", ["Matrix"], 603, "https://a")
+    update = types.Update.model_validate({
+        "update_id": 1,
+        "message": {
+            "message_id": 1, "date": 0, "text": "/eliminar 603",
+            "chat": {"id": int(bot.ADMIN_ID), "type": "private"},
+            "from": {"id": int(bot.ADMIN_ID), "is_bot": False, "first_name": "Admin"},
+        },
+    })
+    asyncio.run(bot.dp.feed_update(bot.bot, update))
+
+    assert bot.get_movie_by_id(603) is not None
+    assert "solo lectura" in sent[0].text
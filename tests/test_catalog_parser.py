@@ -0,0 +1,36 @@
+import io
+import json
+
+import pytest
+
+import bot
+
+
+def parse(text, chunk_size):
+    return list(bot.iter_catalog_items(io.StringIO(text), chunk_size=chunk_size))
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 5, 7, 64 * 1024])
+def test_numbers_split_across_chunks(chunk_size):
+    text = '{"a": 12345, "b": -1.5e10, "c": 0.25}'
+    assert parse(text, chunk_size) == [("a", 12345), ("b", -1.5e10), ("c", 0.25)]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 4, 16, 64 * 1024])
+def test_catalog_entries_match_json_load(chunk_size):
+    catalog = {
+        "matrix": {"names": ["Matrix", "The Matrix"], "id": 603, "link": "https://terabox.com/s/1", "message_ids": {"-100": 7}},
+        "up": {"names": ["Up"], "id": 14160, "link": None, "link_alive": False},
+        "vacía": {},
+    }
+    text = json.dumps(catalog, ensure_ascii=False, indent=4)
+    assert parse(text, chunk_size) == list(catalog.items())
+
+
+def test_empty_catalog():
+    assert parse("  { }  ", 1) == []
+
+
+def test_truncated_catalog_raises():
+    with pytest.raises(json.JSONDecodeError):
+        parse('{"a": {"id": 1}, "b": {"id"', 4)
@@ -0,0 +1,67 @@
+import random
+
+import bot
+from shared_state import SharedStore
+
+
+def test_count_min_sketch_never_underestimates():
+    sketch = bot.CountMinSketch(width=256, depth=4)
+    rng = random.Random(1)
+    counts = {}
+    for _ in range(5000):
+        item = f"película {int(rng.paretovariate(1.2)) % 500}"
+        counts[item] = counts.get(item, 0) + 1
+        sketch.add(item)
+    total = sum(counts.values())
+    for item, count in counts.items():
+        estimate = sketch.estimate(item)
+        assert count <= estimate <= count + 4 * total / 256
+
+
+def test_sketch_round_trips_and_merges():
+    first, second = bot.CountMinSketch(), bot.CountMinSketch()
+    first.add("matrix", 3)
+    second.add("matrix", 2)
+    second.add("up")
+    first.merge_bytes(second.to_bytes())
+    assert first.estimate("matrix") == 5
+    assert first.estimate("up") >= 1
+
+
+def test_top_k_keeps_heaviest_items():
+    top = bot.TopK(k=3)
+    counts = {}
+    for item in ["a"] * 10 + ["b"] * 7 + ["c"] * 5 + ["d"] * 2 + ["e"]:
+        counts[item] = counts.get(item, 0) + 1
+        top.update(item, counts[item])
+    assert top.items() == [("a", 10), ("b", 7), ("c", 5)]
+
+
+def test_demand_tracker_top_and_estimate():
+    tracker = bot.DemandTracker("missing")
+    for title in ["dune"] * 4 + ["up"] * 2 + ["coco"]:
+        tracker.record(title)
+    assert tracker.top("hora", n=2) == [("dune", 4), ("up", 2)]
+    assert tracker.estimate("dune", "día") == 4
+
+
+def test_workers_see_each_others_demand(tmp_path):
+    path = str(tmp_path / "state.sqlite3")
+    trackers = {}
+    for worker in ("worker-0", "worker-1"):
+        store = SharedStore(path, worker)
+        tracker = bot.DemandTracker("missing")
+        trackers[worker] = (store, tracker)
+    trackers["worker-0"][1].record("dune")
+    for title in ["dune", "dune", "up"]:
+        trackers["worker-1"][1].record(title)
+
+    for store, tracker in trackers.values():
+        for window, start, sketch, top in tracker.export():
+            store.save_demand(tracker.name, window, start, sketch, top)
+    for store, tracker in trackers.values():
+        for window, start, _, _ in tracker.export():
+            tracker.set_remote(window, start, store.load_demand(tracker.name, window, start))
+
+    for _, tracker in trackers.values():
+        assert tracker.top("día") == [("dune", 3), ("up", 1)]
@@ -0,0 +1,106 @@
+import asyncio
+import socket
+import time
+
+from aiohttp import web
+
+import bot
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def start_server(hits):
+    async def ok(request):
+        hits.append(request.path)
+        return web.Response(text="<html>Descargar archivo</html>")
+
+    async def expired(request):
+        hits.append(request.path)
+        return web.Response(text="<html>This link has expired</html>")
+
+    async def redirect(request):
+        hits.append(request.path)
+        raise web.HTTPFound("/share/error")
+
+    async def error_page(request):
+        return web.Response(text="<html>Error</html>")
+
+    app = web.Application()
+    app.router.add_get("/ok", ok)
+    app.router.add_get("/expired", expired)
+    app.router.add_get("/redirect", redirect)
+    app.router.add_get("/share/error", error_page)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    port = free_port()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner, f"http://127.0.0.1:{port}"
+
+
+def make_records(base):
+    links = {
+        "ok": f"{base}/ok",
+        "expired": f"{base}/expired",
+        "redirect": f"{base}/redirect",
+        "missing": f"{base}/missing",
+        "unreachable": f"http://127.0.0.1:{free_port()}/",
+    }
+    return {
+        name: bot.MovieRecord(name, [name], movie_id, link)
+        for movie_id, (name, link) in enumerate(links.items(), start=1)
+    }
+
+
+def test_audit_classifies_links_and_persists_results(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(bot, "LINK_AUDIT_SPACING", 0)
+    monkeypatch.setattr(bot, "LINK_AUDIT_TIMEOUT", 5)
+    monkeypatch.setattr(bot, "catalog_journal", None)
+    hits = []
+
+    async def scenario():
+        runner, base = await start_server(hits)
+        try:
+            records = make_records(base)
+            monkeypatch.setattr(bot, "movies_db", records)
+            dead = await bot.audit_links()
+            first_hits = len(hits)
+            # Los resultados siguen vigentes: la siguiente auditoría no sondea nada
+            await bot.audit_links()
+            return records, dead, first_hits
+        finally:
+            await runner.cleanup()
+
+    records, dead, first_hits = asyncio.run(scenario())
+
+    assert records["ok"].link_alive is True
+    assert records["expired"].link_alive is False
+    assert records["redirect"].link_alive is False
+    assert records["missing"].link_alive is False
+    assert records["unreachable"].link_alive is None
+    assert {record.key for record in dead} == {"expired", "redirect", "missing"}
+    assert all(record.link_checked_at for record in records.values())
+    assert len(hits) == first_hits
+
+    # El resultado se guarda con el catálogo y sobrevive a un reinicio
+    reloaded = dict(bot.iter_catalog_items(open(bot.MOVIES_DB_FILE, encoding="utf-8")))
+    assert reloaded["expired"]["link_alive"] is False
+    assert reloaded["ok"]["link_checked_at"] == records["ok"].link_checked_at
+
+
+def test_next_audit_waits_for_oldest_result(monkeypatch):
+    now = time.time()
+    records = {
+        "a": bot.MovieRecord("a", ["a"], 1, "x", link_alive=True, link_checked_at=now - 3600),
+        "b": bot.MovieRecord("b", ["b"], 2, "y", link_alive=False, link_checked_at=now - 7200),
+        "c": bot.MovieRecord("c", ["c"], 3, "z"),
+    }
+    monkeypatch.setattr(bot, "movies_db", records)
+    assert bot.next_link_audit_delay(now) == bot.LINK_STATUS_TTL - 7200
+
+    monkeypatch.setattr(bot, "movies_db", {"c": records["c"]})
+    assert bot.next_link_audit_delay(now) == 0
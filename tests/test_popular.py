@@ -0,0 +1,31 @@
+import pytest
+
+import bot
+
+RANKED = [{"id": 603, "title": "Matrix"}, {"id": 604, "title": "Matrix Reloaded"}]
+
+
+@pytest.fixture
+def catalog(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(bot, "catalog_journal", None)
+    monkeypatch.setattr(bot, "shared_store", None)
+    monkeypatch.setattr(bot, "movies_db", {})
+    monkeypatch.setattr(bot, "catalog_indexed", False)
+    for name in ("popular_ranked", "popular_in_catalog", "popular_missing"):
+        monkeypatch.setattr(bot, name, [])
+    bot.cross_popular_with_catalog(RANKED)
+
+
+def test_popular_cross_follows_catalog_changes(catalog):
+    assert [result["id"] for result in bot.popular_missing] == [603, 604]
+
+    record = bot.upsert_movie("matrix", ["matrix"], 603, "https://example.com/matrix")
+    bot.refresh_popular_cross()
+    assert bot.popular_in_catalog == [record]
+    assert [result["id"] for result in bot.popular_missing] == [604]
+
+    bot.delete_movie(record)
+    bot.refresh_popular_cross()
+    assert bot.popular_in_catalog == []
+    assert [result["id"] for result in bot.popular_missing] == [603, 604]
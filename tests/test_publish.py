@@ -0,0 +1,137 @@
+import asyncio
+import types as pytypes
+
+import pytest
+from aiogram.exceptions import TelegramBadRequest, TelegramNetworkError, TelegramRetryAfter
+
+import bot
+
+MOVIE = {"id": 603, "title": "Matrix", "overview": "Neo", "release_date": "1999-03-31", "vote_average": 8.2, "poster_path": "/p.jpg"}
+CHANNEL = bot.TELEGRAM_CHANNEL_ID
+
+
+@pytest.fixture
+def telegram(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(bot, "catalog_journal", None)
+    monkeypatch.setattr(bot, "shared_store", None)
+    monkeypatch.setattr(bot, "TELEGRAM_CHANNEL_IDS", [CHANNEL])
+    monkeypatch.setattr(bot, "movies_db", {})
+    monkeypatch.setattr(bot, "catalog_indexed", False)
+    bot.rendered_posts.clear()
+    calls = []
+    next_id = [100]
+
+    async def send_photo(**kwargs):
+        calls.append(("send", None))
+        await asyncio.sleep(0.05)
+        next_id[0] += 1
+        return pytypes.SimpleNamespace(message_id=next_id[0])
+
+    async def delete_message(**kwargs):
+        calls.append(("delete", kwargs["message_id"]))
+        await asyncio.sleep(0.05)
+
+    def editor(name, fail_for=()):
+        async def edit(**kwargs):
+            calls.append((name, kwargs["message_id"]))
+            if kwargs["message_id"] in fail_for:
+                raise TelegramBadRequest(method=None, message="Bad Request: message to edit not found")
+        return edit
+
+    monkeypatch.setattr(bot.bot, "send_photo", send_photo)
+    monkeypatch.setattr(bot.bot, "delete_message", delete_message)
+    monkeypatch.setattr(bot.bot, "edit_message_caption", editor("edit_caption"))
+    monkeypatch.setattr(bot.bot, "edit_message_media", editor("edit_media", fail_for=(999,)))
+    record = bot.MovieRecord("matrix", ["Matrix"], 603, "https://a")
+    bot.movies_db["matrix"] = record
+    return record, calls
+
+
+def test_bump_overlaps_delete_and_send(telegram):
+    record, calls = telegram
+    record.message_ids[CHANNEL] = 50
+
+    async def scenario():
+        start = asyncio.get_running_loop().time()
+        result = await bot.publish_movie(MOVIE, record.link)
+        return result, asyncio.get_running_loop().time() - start
+
+    (sent, failed), elapsed = asyncio.run(scenario())
+    assert (sent, failed) == (1, [])
+    assert sorted(calls) == [("delete", 50), ("send", None)]
+    assert elapsed < 0.09
+    assert record.message_ids[CHANNEL] == 101
+
+
+def test_edit_mode_skips_unchanged_posts_and_edits_changed_captions(telegram):
+    record, calls = telegram
+    asyncio.run(bot.publish_movie(MOVIE, record.link))
+    calls.clear()
+
+    asyncio.run(bot.publish_movie(MOVIE, record.link, bump=False))
+    assert calls == []
+
+    asyncio.run(bot.publish_movie(dict(MOVIE, overview="Trinity"), record.link, bump=False))
+    assert calls == [("edit_caption", 101)]
+
+
+def test_edit_mode_remembers_published_posts_across_restarts(telegram):
+    record, calls = telegram
+    asyncio.run(bot.publish_movie(MOVIE, record.link))
+    # Reinicio: el registro se vuelve a leer de la instantánea
+    bot.movies_db["matrix"] = bot.MovieRecord.from_dict("matrix", record.to_dict())
+    calls.clear()
+
+    asyncio.run(bot.publish_movie(MOVIE, record.link, bump=False))
+    assert calls == []
+
+
+def test_edit_mode_replaces_the_poster_when_the_published_one_is_unknown(telegram):
+    # Tras un reinicio no se sabe qué póster tiene el mensaje publicado
+    record, calls = telegram
+    record.message_ids[CHANNEL] = 60
+    asyncio.run(bot.publish_movie(MOVIE, record.link, bump=False))
+    assert calls == [("edit_media", 60)]
+    assert record.message_ids[CHANNEL] == 60
+
+
+def test_edit_mode_republishes_when_the_message_cannot_be_edited(telegram):
+    record, calls = telegram
+    record.message_ids[CHANNEL] = 999
+    sent, _ = asyncio.run(bot.publish_movie(MOVIE, record.link, bump=False))
+    assert sent == 1
+    assert calls[0] == ("edit_media", 999)
+    assert sorted(calls[1:]) == [("delete", 999), ("send", None)]
+    assert record.message_ids[CHANNEL] == 101
+
+
+def test_edit_mode_waits_and_retries_when_telegram_asks_to(telegram, monkeypatch):
+    record, calls = telegram
+    record.message_ids[CHANNEL] = 60
+    errors = [TelegramRetryAfter(method=None, message="Too Many Requests", retry_after=0)]
+
+    async def edit_media(**kwargs):
+        calls.append(("edit_media", kwargs["message_id"]))
+        if errors:
+            raise errors.pop()
+
+    monkeypatch.setattr(bot.bot, "edit_message_media", edit_media)
+    sent, failed = asyncio.run(bot.publish_movie(MOVIE, record.link, bump=False))
+    assert (sent, failed) == (1, [])
+    assert calls == [("edit_media", 60), ("edit_media", 60)]
+
+
+def test_edit_mode_does_not_republish_on_network_errors(telegram, monkeypatch):
+    record, calls = telegram
+    record.message_ids[CHANNEL] = 60
+
+    async def edit_media(**kwargs):
+        calls.append(("edit_media", kwargs["message_id"]))
+        raise TelegramNetworkError(method=None, message="Request timeout error")
+
+    monkeypatch.setattr(bot.bot, "edit_message_media", edit_media)
+    sent, failed = asyncio.run(bot.publish_movie(MOVIE, record.link, bump=False))
+    assert (sent, failed) == (0, [CHANNEL])
+    assert calls == [("edit_media", 60)]
+    assert record.message_ids[CHANNEL] == 60
@@ -0,0 +1,50 @@
+from shared_state import SharedStore
+
+
+def test_changes_are_pruned_once_every_worker_read_them(tmp_path):
+    path = str(tmp_path / "state.sqlite3")
+    leader, other = SharedStore(path, "worker-0"), SharedStore(path, "worker-1")
+    leader.load_catalog()
+    other.load_catalog()
+
+    for i in range(5):
+        leader.put_entry(f"k{i}", {"id": i})
+    leader.fetch_changes()
+    # worker-1 todavía no leyó los cambios
+    assert leader.prune_changes(600) == 0
+
+    assert [key for key, _ in other.fetch_changes()] == [f"k{i}" for i in range(5)]
+    assert leader.prune_changes(600) == 5
+    assert leader.query("SELECT COUNT(*) FROM catalog_changes") == [(0,)]
+
+
+def test_inactive_workers_do_not_block_pruning(tmp_path):
+    path = str(tmp_path / "state.sqlite3")
+    leader, stale = SharedStore(path, "worker-0"), SharedStore(path, "worker-1")
+    leader.load_catalog()
+    stale.load_catalog()
+    leader.query("UPDATE change_cursors SET updated_at = 0 WHERE worker = 'worker-1'")
+
+    leader.put_entry("k", {"id": 1})
+    leader.fetch_changes()
+    assert leader.prune_changes(600) == 1
+
+
+def test_field_changes_from_two_workers_do_not_overwrite_each_other(tmp_path):
+    path = str(tmp_path / "state.sqlite3")
+    leader, other = SharedStore(path, "worker-0"), SharedStore(path, "worker-1")
+    leader.put_entry("matrix", {"names": ["Matrix"], "id": 603, "link": "a", "message_ids": {}, "link_alive": None})
+    other.load_catalog()
+
+    other.apply_change("set_message_id", "matrix", {"chat_id": -100, "message_id": 7, "post_hash": "a:b"})
+    leader.apply_change("set_link_alive", "matrix", {"alive": False, "checked_at": 123.0})
+
+    (key, data), = leader.fetch_changes()
+    assert key == "matrix"
+    assert data["message_ids"] == {"-100": 7} and data["post_hashes"] == {"-100": "a:b"}
+    assert data["link_alive"] is False and data["link_checked_at"] == 123.0
+
+    other.apply_change("update_link", "matrix", {"link": "b"})
+    other.apply_change("set_message_id", "matrix", {"chat_id": -100, "message_id": None})
+    (_, data), = leader.fetch_changes()
+    assert data["link"] == "b" and data["link_alive"] is None and data["message_ids"] == {} and data["post_hashes"] == {}